@@ -0,0 +1,167 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from carla_vehicle import CarlaController
+from shard_proxy import SHARD_WORKERS, ShardedController
+
+
+RPC_WORKERS = int(os.environ.get("CARLA_RPC_WORKERS", "8"))
+RPC_TIMEOUT = float(os.environ.get("CARLA_RPC_TIMEOUT", "10.0"))  # Seconds, for operations not listed below
+
+# Per-operation timeouts in seconds; slower operations get more room
+OPERATION_TIMEOUTS = {
+    "create": 15.0,  # May have to open the client connection first
+    "spawn_vehicle": 10.0,
+    "destroy_vehicle": 5.0,
+    "start_drive": 15.0,  # Plans the whole route
+    "stop_drive": 2.0,
+    "start_telemetry": 5.0,
+    "stop_telemetry": 5.0,
+    "attach_camera": 10.0,
+    "detach_camera": 10.0,
+    "start_streaming": 5.0,
+    "stop_streaming": 5.0,
+    "start_frame_export": 5.0,
+    "stop_frame_export": 5.0,
+    "start_detection": 5.0,
+    "stop_detection": 5.0,
+    "spawn_fleet": 60.0,
+    "destroy_fleet": 30.0,
+    "destroy_instance": 10.0,
+}
+
+# Robots live in this process, or in shard worker processes when CARLA_SHARD_WORKERS > 0
+ControllerBackend = ShardedController if SHARD_WORKERS else CarlaController
+
+
+class RpcTimeout(TimeoutError):
+    """A simulator operation did not finish within its timeout; it keeps running on its worker"""
+
+    def __init__(self, operation, timeout):
+        super().__init__(f"{operation} timed out after {timeout}s")
+        self.operation = operation
+        self.timeout = timeout
+
+
+class RpcExecutor:
+    """Dedicated, sized thread pool that every blocking CARLA call from the async API runs on
+
+    Keeps simulator round trips off the event loop and out of the shared
+    threadpool Starlette uses for sync endpoints, and bounds how many run at once.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(RPC_WORKERS)
+            return cls._instance
+
+    def __init__(self, workers=RPC_WORKERS):
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="carla-rpc")
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "timeouts": 0, "in_flight": 0}
+
+    def _count(self, **changes):
+        with self._lock:
+            for name, change in changes.items():
+                self.stats[name] += change
+
+    def _run(self, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self._count(failed=1, in_flight=-1)
+            raise
+        self._count(completed=1, in_flight=-1)
+        return result
+
+    async def run(self, operation, fn, *args, timeout=None, **kwargs):
+        """Await fn(*args, **kwargs) on the pool; raises RpcTimeout after the operation's timeout"""
+        if timeout is None:
+            timeout = OPERATION_TIMEOUTS.get(operation, RPC_TIMEOUT)
+        self._count(submitted=1, in_flight=1)
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(self._run, fn, args, kwargs))
+        # Retrieve the outcome even if nobody awaits it any more, so a late failure is not reported as unhandled
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            # A worker thread cannot be interrupted, so a timed-out call is left to finish on its own
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._count(timeouts=1)
+            raise RpcTimeout(operation, timeout)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, workers=self.workers)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _operation(name):
+    async def call(self, *args, **kwargs):
+        return await self.executor.run(name, getattr(self.controller, name), *args, **kwargs)
+    call.__name__ = name
+    call.__doc__ = f"Awaitable CarlaController.{name}, run on the RPC executor"
+    return call
+
+
+class AsyncCarlaController:
+    """Async facade over a CarlaController (or its shard proxy) for the API's event loop
+
+    Every operation that talks to the simulator is awaited on the RPC executor
+    with its own timeout. Anything else (state flags, frame broadcaster,
+    cached telemetry and detections) is read straight from the controller.
+    """
+
+    @classmethod
+    async def get_instance(cls, robot_id):
+        """Get or create the controller for a robot without blocking the event loop"""
+        executor = RpcExecutor.get_instance()
+        return cls(await executor.run("create", ControllerBackend.get_instance, robot_id), executor)
+
+    @classmethod
+    def lookup(cls, robot_id):
+        controller = ControllerBackend.lookup(robot_id)
+        return cls(controller) if controller is not None else None
+
+    @classmethod
+    async def spawn_fleet(cls, robot_ids):
+        return await RpcExecutor.get_instance().run("spawn_fleet", ControllerBackend.spawn_fleet, robot_ids)
+
+    @classmethod
+    async def destroy_fleet(cls, robot_ids=None):
+        return await RpcExecutor.get_instance().run("destroy_fleet", ControllerBackend.destroy_fleet, robot_ids)
+
+    @classmethod
+    async def destroy_instance(cls, robot_id):
+        return await RpcExecutor.get_instance().run("destroy_instance", ControllerBackend.destroy_instance, robot_id)
+
+    def __init__(self, controller, executor=None):
+        self.controller = controller
+        self.executor = executor or RpcExecutor.get_instance()
+
+    def __getattr__(self, name):
+        return getattr(self.controller, name)
+
+    spawn_vehicle = _operation("spawn_vehicle")
+    destroy_vehicle = _operation("destroy_vehicle")
+    start_drive = _operation("start_drive")
+    stop_drive = _operation("stop_drive")
+    start_telemetry = _operation("start_telemetry")
+    stop_telemetry = _operation("stop_telemetry")
+    attach_camera = _operation("attach_camera")
+    detach_camera = _operation("detach_camera")
+    start_streaming = _operation("start_streaming")
+    stop_streaming = _operation("stop_streaming")
+    start_frame_export = _operation("start_frame_export")
+    stop_frame_export = _operation("stop_frame_export")
+    start_detection = _operation("start_detection")
+    stop_detection = _operation("stop_detection")
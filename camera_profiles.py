@@ -0,0 +1,50 @@
+from dataclasses import dataclass, asdict, replace
+
+
+@dataclass(frozen=True)
+class CameraProfile:
+    """Capture, mount and encode settings for a robot camera"""
+    name: str
+    width: int = 640
+    height: int = 480
+    fov: float = 90.0
+    fps: float = None  # None captures on every simulation tick
+    quality: int = None  # JPEG quality 1-100, None uses the OpenCV default (95)
+    mount_x: float = 1.5
+    mount_y: float = 0.0
+    mount_z: float = 2.4
+    pitch: float = 0.0
+
+    @property
+    def sensor_tick(self):
+        return 1.0 / self.fps if self.fps else 0.0
+
+    def with_overrides(self, **overrides):
+        """Copy of this profile with every non-None override applied"""
+        changes = {k: v for k, v in overrides.items() if v is not None}
+        return replace(self, **changes) if changes else self
+
+    def to_dict(self):
+        return asdict(self)
+
+
+CAMERA_PROFILES = {
+    "default": CameraProfile("default"),
+    "low_bandwidth": CameraProfile("low_bandwidth", width=320, height=240, fps=5, quality=60),
+    "dataset": CameraProfile("dataset", width=1920, height=1080, fov=90.0, quality=95),
+}
+
+
+def get_camera_profile(name=None, **overrides):
+    """Resolve a named profile plus explicit overrides; raises ValueError for unknown names"""
+    name = name or "default"
+    if name not in CAMERA_PROFILES:
+        raise ValueError(f"Unknown camera profile '{name}', choose from {sorted(CAMERA_PROFILES)}")
+    profile = CAMERA_PROFILES[name].with_overrides(**overrides)
+    if profile.width <= 0 or profile.height <= 0:
+        raise ValueError("Camera width and height must be positive")
+    if profile.quality is not None and not 1 <= profile.quality <= 100:
+        raise ValueError("JPEG quality must be between 1 and 100")
+    if profile.fps is not None and profile.fps <= 0:
+        raise ValueError("Camera fps must be positive")
+    return profile
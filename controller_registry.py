@@ -0,0 +1,115 @@
+import threading
+from contextlib import contextmanager
+
+
+class _Flight:
+    """One in-progress construction that concurrent callers for the same id wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None  # Set only when the factory returned
+        self.error = None
+
+
+class ControllerRegistry:
+    """Thread-safe robot_id -> controller map with single-flight creation
+
+    Concurrent get_or_create() calls for a new id share one construction, so
+    a robot is never built twice. get() never constructs, and controllers()
+    returns a cached snapshot that is cheap to iterate for fleet-wide work.
+    """
+
+    def __init__(self):
+        self._controllers = {}
+        self._flights = {}  # robot_id -> _Flight while it is being constructed
+        self._claimed = set()  # Ids handed out by claim() and not yet given back
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def get(self, robot_id):
+        """Controller for robot_id, or None; never constructs"""
+        return self._controllers.get(robot_id)
+
+    def __contains__(self, robot_id):
+        return robot_id in self._controllers
+
+    def __len__(self):
+        return len(self._controllers)
+
+    def ids(self):
+        return [controller.robot_id for controller in self.controllers()]
+
+    def controllers(self):
+        """Immutable snapshot of all controllers, rebuilt only after the registry changed"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot = tuple(self._controllers.values())
+        return snapshot
+
+    def get_or_create(self, robot_id, factory):
+        """Existing controller, or the one built by factory(robot_id) exactly once across threads"""
+        controller = self._controllers.get(robot_id)
+        if controller is not None:
+            return controller
+        with self._lock:
+            controller = self._controllers.get(robot_id)
+            if controller is not None:
+                return controller
+            flight = self._flights.get(robot_id)
+            owner = flight is None
+            if owner:
+                flight = self._flights[robot_id] = _Flight()
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.result is None:
+                raise RuntimeError(f"Creating the controller for robot {robot_id} was interrupted")
+            return flight.result
+
+        try:
+            flight.result = factory(robot_id)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            # Interrupted factories (KeyboardInterrupt, cancellation) leave no result and register nothing
+            with self._lock:
+                del self._flights[robot_id]
+                if flight.result is not None:
+                    self._controllers[robot_id] = flight.result
+                    self._snapshot = None
+            flight.done.set()
+        return flight.result
+
+    @contextmanager
+    def claim(self, prefix, count):
+        """Reserve the next `count` unused ids "<prefix>_<n>" for the duration of the block
+
+        Concurrent claims never hand out the same id, so two bulk spawns cannot
+        both pick (and spawn a vehicle for) the same robot.
+        """
+        with self._lock:
+            robot_ids = []
+            n = 0
+            while len(robot_ids) < count:
+                n += 1
+                robot_id = f"{prefix}_{n}"
+                if robot_id not in self._controllers and robot_id not in self._flights and robot_id not in self._claimed:
+                    robot_ids.append(robot_id)
+            self._claimed.update(robot_ids)
+        try:
+            yield robot_ids
+        finally:
+            with self._lock:
+                self._claimed.difference_update(robot_ids)
+
+    def pop(self, robot_id):
+        """Remove and return a controller, or None"""
+        with self._lock:
+            controller = self._controllers.pop(robot_id, None)
+            if controller is not None:
+                self._snapshot = None
+            return controller
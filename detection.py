@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+import cv2
+import numpy as np
+
+
+DETECTOR_BACKEND = os.environ.get("CARLA_DETECTOR", "cpu")
+DETECTOR_ADDRESS = os.environ.get("CARLA_DETECTOR_ADDRESS", "localhost:50051")
+DETECTION_BATCH_SIZE = int(os.environ.get("CARLA_DETECTION_BATCH_SIZE", "8"))
+DETECTION_MAX_LATENCY = float(os.environ.get("CARLA_DETECTION_MAX_LATENCY", "0.05"))
+ERROR_BACKOFF = 0.1  # Seconds before retrying after a failed batch, doubled per consecutive failure
+MAX_ERROR_BACKOFF = 5.0
+
+
+class DetectorBackend(ABC):
+    """Runs a model on a batch of same-sized BGR frames"""
+    name = "base"
+
+    @abstractmethod
+    def detect_batch(self, batch):
+        """batch is a (N, H, W, 3) uint8 array; returns one list of detection dicts per frame"""
+
+
+class CpuBlobDetector(DetectorBackend):
+    """Local CPU stand-in model: reports bright grid cells, for exercising the pipeline without a model server"""
+    name = "cpu"
+
+    def __init__(self, grid=8, threshold=200.0):
+        self.grid = grid
+        self.threshold = threshold
+
+    def detect_batch(self, batch):
+        n, h, w, _ = batch.shape
+        cell_h, cell_w = h // self.grid, w // self.grid
+        cells = batch[:, :cell_h * self.grid, :cell_w * self.grid]
+        cells = cells.reshape(n, self.grid, cell_h, self.grid, cell_w, 3).mean(axis=(2, 4, 5), dtype=np.float32)
+        results = []
+        for i in range(n):
+            ys, xs = np.nonzero(cells[i] >= self.threshold)
+            results.append([{
+                "label": "bright_region",
+                "confidence": round(float(cells[i, y, x]) / 255.0, 3),
+                "bbox": [int(x * cell_w), int(y * cell_h), int((x + 1) * cell_w), int((y + 1) * cell_h)],
+            } for y, x in zip(ys, xs)])
+        return results
+
+
+class GrpcYoloDetector(DetectorBackend):
+    """YOLO gRPC analytics server (github.com/pratikkorat26/carlaaianalyticsserver)
+
+    The server takes one JPEG per call, so a batch is sent as concurrent calls.
+    Needs grpcio and the detection_pb2 / detection_pb2_grpc modules generated from its proto.
+    """
+    name = "grpc"
+
+    def __init__(self, address=DETECTOR_ADDRESS, timeout=2.0):
+        try:
+            import grpc
+            import detection_pb2
+            import detection_pb2_grpc
+        except ImportError as e:
+            raise RuntimeError(f"gRPC detector unavailable: {e}")
+        self._pb2 = detection_pb2
+        self.timeout = timeout
+        self._channel = grpc.insecure_channel(address)
+        self._stub = detection_pb2_grpc.YOLODetectionStub(self._channel)
+
+    def detect_batch(self, batch):
+        futures = []
+        for frame in batch:
+            _, buffer = cv2.imencode('.jpg', frame)
+            request = self._pb2.DetectionRequest(image=buffer.tobytes())
+            futures.append(self._stub.Detect.future(request, timeout=self.timeout))
+        return [[{"label": d.label, "confidence": d.confidence} for d in f.result().detections] for f in futures]
+
+
+DETECTOR_BACKENDS = {
+    CpuBlobDetector.name: CpuBlobDetector,
+    GrpcYoloDetector.name: GrpcYoloDetector,
+}
+
+
+def create_detector(name=DETECTOR_BACKEND):
+    if name not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend '{name}', choose from {sorted(DETECTOR_BACKENDS)}")
+    return DETECTOR_BACKENDS[name]()
+
+
+class DetectionService:
+    """Collects the latest frames of every robot with detection enabled and runs them through the detector in batches"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(create_detector(), DETECTION_BATCH_SIZE, DETECTION_MAX_LATENCY)
+            return cls._instance
+
+    def __init__(self, backend, batch_size=DETECTION_BATCH_SIZE, max_latency=DETECTION_MAX_LATENCY):
+        self.backend = backend
+        self.batch_size = batch_size  # Frames per detector call
+        self.max_latency = max_latency  # Seconds a partial batch waits for more frames
+        self._controllers = {}
+        self._last_sequences = {}
+        self._results = {}
+        self._lock = threading.Lock()
+        self._frame_ready = threading.Event()
+        self._thread = None
+        self._rotation = 0
+        self.stats = {"batches": 0, "frames": 0, "stale_frames": 0, "errors": 0,
+                      "last_batch_size": 0, "last_wait_ms": 0.0, "last_inference_ms": 0.0}
+
+    def configure(self, batch_size=None, max_latency=None):
+        if batch_size is not None:
+            self.batch_size = max(1, int(batch_size))
+        if max_latency is not None:
+            self.max_latency = max(0.0, float(max_latency))
+        return {"batch_size": self.batch_size, "max_latency": self.max_latency, "backend": self.backend.name}
+
+    def enable(self, controller):
+        with self._lock:
+            self._controllers[controller.robot_id] = controller
+            self._last_sequences[controller.robot_id] = 0
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="detection-service", daemon=True)
+                self._thread.start()
+
+    def disable(self, robot_id):
+        with self._lock:
+            self._controllers.pop(robot_id, None)
+            self._last_sequences.pop(robot_id, None)
+            self._results.pop(robot_id, None)
+
+    def frame_ready(self):
+        """Called by controllers after writing a raw frame, wakes the batcher"""
+        self._frame_ready.set()
+
+    def get_result(self, robot_id):
+        with self._lock:
+            return self._results.get(robot_id)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, robots=len(self._controllers), **self.configure())
+
+    def _new_frames(self, taken):
+        # Rotate the starting robot so large fleets share batch slots fairly
+        with self._lock:
+            controllers = list(self._controllers.items())
+            last_sequences = dict(self._last_sequences)
+        if controllers:
+            self._rotation = (self._rotation + 1) % len(controllers)
+            controllers = controllers[self._rotation:] + controllers[:self._rotation]
+        for robot_id, controller in controllers:
+            if robot_id in taken:
+                continue
+            ring = controller.frame_ring
+            frame = ring.latest() if ring is not None else None
+            if frame is not None and frame.sequence > last_sequences.get(robot_id, 0):
+                taken[robot_id] = (ring, frame)
+                if len(taken) >= self.batch_size:
+                    break
+
+    def _collect_batch(self):
+        batch = {}
+        deadline = None
+        while True:
+            self._new_frames(batch)
+            if len(batch) >= self.batch_size:
+                return batch
+            now = time.monotonic()
+            if batch and deadline is None:
+                deadline = now + self.max_latency
+            if deadline is not None and now >= deadline:
+                return batch
+            self._frame_ready.wait(0.5 if deadline is None else deadline - now)
+            self._frame_ready.clear()
+
+    def _loop(self):
+        backoff = 0.0
+        while True:
+            if backoff:
+                # The detector is failing (e.g. its server is down): wait instead of retrying at once
+                time.sleep(backoff)
+            started = time.monotonic()
+            batch = self._collect_batch()
+            collected = time.monotonic()
+
+            # Group by frame size so each backend call gets one contiguous array
+            groups = {}
+            for robot_id, (ring, frame) in batch.items():
+                groups.setdefault(frame.data.shape, []).append((robot_id, ring, frame))
+            for shape, entries in groups.items():
+                array = np.stack([frame.data for _, _, frame in entries])
+                # The copy is only usable if no slot was overwritten while stacking
+                valid = [(i, robot_id, frame) for i, (robot_id, ring, frame) in enumerate(entries) if ring.is_valid(frame)]
+                stale = len(entries) - len(valid)
+                if not valid:
+                    with self._lock:
+                        self.stats["stale_frames"] += stale
+                    continue
+                if stale:
+                    array = array[[i for i, _, _ in valid]]
+                try:
+                    inference_started = time.monotonic()
+                    detections = self.backend.detect_batch(array)
+                    inference_ms = (time.monotonic() - inference_started) * 1000.0
+                except Exception as e:
+                    print(f"❌ Detection batch failed: {e}")
+                    with self._lock:
+                        self.stats["errors"] += 1
+                        # The failed frames count as consumed, so the next batch waits for new ones
+                        for _, robot_id, frame in valid:
+                            if robot_id in self._last_sequences:
+                                self._last_sequences[robot_id] = frame.sequence
+                    backoff = min(max(backoff * 2, ERROR_BACKOFF), MAX_ERROR_BACKOFF)
+                    continue
+                backoff = 0.0
+                with self._lock:
+                    for (_, robot_id, frame), found in zip(valid, detections):
+                        if robot_id not in self._controllers:
+                            continue
+                        self._last_sequences[robot_id] = frame.sequence
+                        self._results[robot_id] = {
+                            "robot_id": robot_id,
+                            "frame_id": frame.frame_id,
+                            "sim_time": frame.timestamp,
+                            "detections": found,
+                            "batch_size": len(valid),
+                            "inference_ms": inference_ms,
+                        }
+                    self.stats["batches"] += 1
+                    self.stats["frames"] += len(valid)
+                    self.stats["stale_frames"] += stale
+                    self.stats["last_batch_size"] = len(valid)
+                    self.stats["last_wait_ms"] = (collected - started) * 1000.0
+                    self.stats["last_inference_ms"] = inference_ms
@@ -0,0 +1,728 @@
+import fnmatch
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+# In-process stand-in for the subset of the carla module this server uses, selected with CARLA_BACKEND=fake.
+# Every endpoint gets its own simulated world; nothing listens on a port.
+FAKE_LATENCY = float(os.environ.get("CARLA_FAKE_LATENCY", "0"))  # Seconds added to every simulated RPC
+FAKE_DELTA = float(os.environ.get("CARLA_FAKE_DELTA", "0.05"))  # Simulated seconds per tick without a fixed delta
+FAKE_CAMERA_FPS = float(os.environ.get("CARLA_FAKE_CAMERA_FPS", "0"))  # Caps synthetic frames per camera, 0 follows sensor_tick
+FAKE_GRID = int(os.environ.get("CARLA_FAKE_GRID", "6"))  # Intersections per side of the generated town
+FAKE_SENSOR_THREADS = int(os.environ.get("CARLA_FAKE_SENSOR_THREADS", str(os.cpu_count() or 4)))
+
+BLOCK_SIZE = 100.0  # Metres between intersections
+JUNCTION_INSET = 6.0  # Metres from the intersection centre where a lane ends
+LANE_WIDTH = 3.5
+SPAWN_SPACING = 12.0  # Metres between spawn points along a lane
+WHEELBASE = 2.9
+MAX_STEER_ANGLE = math.radians(70.0)
+MAX_SPEED = 40.0  # m/s
+FRAME_VARIANTS = 8  # Synthetic images cycled per resolution
+
+_actor_ids = itertools.count(1)
+
+
+def _rpc():
+    # Stand-in for a round trip to the simulator
+    if FAKE_LATENCY > 0:
+        time.sleep(FAKE_LATENCY)
+
+
+class Vector3D:
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def length(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    def __add__(self, other):
+        return type(self)(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return type(self)(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(x={self.x:.6f}, y={self.y:.6f}, z={self.z:.6f})"
+
+
+class Location(Vector3D):
+    def distance(self, other):
+        return math.sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2 + (self.z - other.z) ** 2)
+
+
+class Rotation:
+    def __init__(self, pitch=0.0, yaw=0.0, roll=0.0):
+        self.pitch = float(pitch)
+        self.yaw = float(yaw)
+        self.roll = float(roll)
+
+    def __repr__(self):
+        return f"Rotation(pitch={self.pitch:.6f}, yaw={self.yaw:.6f}, roll={self.roll:.6f})"
+
+
+class Transform:
+    def __init__(self, location=None, rotation=None):
+        self.location = location if location is not None else Location()
+        self.rotation = rotation if rotation is not None else Rotation()
+
+    def __repr__(self):
+        return f"Transform({self.location}, {self.rotation})"
+
+
+class VehicleControl:
+    def __init__(self, throttle=0.0, steer=0.0, brake=0.0, hand_brake=False, reverse=False, manual_gear_shift=False,
+                 gear=0):
+        self.throttle = float(throttle)
+        self.steer = float(steer)
+        self.brake = float(brake)
+        self.hand_brake = bool(hand_brake)
+        self.reverse = bool(reverse)
+        self.manual_gear_shift = manual_gear_shift
+        self.gear = gear
+
+
+class WorldSettings:
+    def __init__(self, synchronous_mode=False, fixed_delta_seconds=None, no_rendering_mode=False):
+        self.synchronous_mode = synchronous_mode
+        self.fixed_delta_seconds = fixed_delta_seconds
+        self.no_rendering_mode = no_rendering_mode
+
+
+class Timestamp:
+    def __init__(self, frame, elapsed_seconds, delta_seconds):
+        self.frame = frame
+        self.elapsed_seconds = elapsed_seconds
+        self.delta_seconds = delta_seconds
+        self.platform_timestamp = time.time()
+
+
+class ActorBlueprint:
+    def __init__(self, id, tags=(), **attributes):
+        self.id = id
+        self.tags = list(tags)
+        self._attributes = {k: str(v) for k, v in attributes.items()}
+
+    def has_attribute(self, name):
+        return name in self._attributes
+
+    def get_attribute(self, name):
+        return self._attributes[name]
+
+    def set_attribute(self, name, value):
+        self._attributes[name] = str(value)
+
+
+class BlueprintLibrary:
+    def __init__(self, blueprints):
+        self._blueprints = blueprints
+
+    def filter(self, wildcard_pattern):
+        return [bp for bp in self._blueprints if fnmatch.fnmatch(bp.id, wildcard_pattern)
+                or fnmatch.fnmatch(bp.id, f"*{wildcard_pattern}*")]
+
+    def find(self, id):
+        for bp in self._blueprints:
+            if bp.id == id:
+                return bp
+        raise IndexError(f"Blueprint '{id}' not found")
+
+    def __iter__(self):
+        return iter(self._blueprints)
+
+    def __len__(self):
+        return len(self._blueprints)
+
+
+def _blueprint_library():
+    # A fresh library per call, like the real client, so set_attribute never leaks between callers
+    return BlueprintLibrary([
+        ActorBlueprint("vehicle.tesla.model3", ("vehicle",), role_name="autopilot"),
+        ActorBlueprint("vehicle.audi.a2", ("vehicle",), role_name="autopilot"),
+        ActorBlueprint("vehicle.lincoln.mkz_2020", ("vehicle",), role_name="autopilot"),
+        ActorBlueprint("sensor.camera.rgb", ("sensor", "camera"), image_size_x=800, image_size_y=600, fov=90.0,
+                       sensor_tick=0.0),
+    ])
+
+
+class _Lane:
+    """Straight one-way lane between two points, with the lanes it leads into"""
+
+    def __init__(self, index, road_id, lane_id, start, end, is_junction=False):
+        self.index = index
+        self.road_id = road_id
+        self.lane_id = lane_id
+        self.start = start
+        self.end = end
+        self.is_junction = is_junction
+        self.length = start.distance(end)
+        self.yaw = math.degrees(math.atan2(end.y - start.y, end.x - start.x))
+        self.successors = []
+
+    def location(self, s):
+        t = s / self.length if self.length else 0.0
+        return Location(self.start.x + (self.end.x - self.start.x) * t,
+                        self.start.y + (self.end.y - self.start.y) * t,
+                        self.start.z + (self.end.z - self.start.z) * t)
+
+    def project(self, location):
+        """(distance along the lane, squared distance from it) of the closest point to a location"""
+        dx, dy = self.end.x - self.start.x, self.end.y - self.start.y
+        s = ((location.x - self.start.x) * dx + (location.y - self.start.y) * dy) / (self.length or 1.0)
+        s = min(max(s, 0.0), self.length)
+        point = self.location(s)
+        return s, (point.x - location.x) ** 2 + (point.y - location.y) ** 2
+
+
+class Waypoint:
+    def __init__(self, lane, s):
+        self._lane = lane
+        self.s = s
+        self.road_id = lane.road_id
+        self.section_id = 0
+        self.lane_id = lane.lane_id
+        self.lane_width = LANE_WIDTH
+        self.is_junction = lane.is_junction
+        self.id = hash((lane.index, round(s, 2)))
+        self.transform = Transform(lane.location(s), Rotation(yaw=lane.yaw))
+
+    def next(self, distance):
+        s = self.s + distance
+        if s <= self._lane.length:
+            return [Waypoint(self._lane, s)]
+        remaining = s - self._lane.length
+        return [Waypoint(lane, min(remaining, lane.length)) for lane in self._lane.successors]
+
+    def previous(self, distance):
+        return [Waypoint(self._lane, max(self.s - distance, 0.0))]
+
+
+class Map:
+    """Square grid town: two-way roads between FAKE_GRID x FAKE_GRID intersections, joined by junction lanes"""
+
+    def __init__(self, grid=FAKE_GRID):
+        self.name = f"FakeTown_{grid}x{grid}"
+        self.lanes = []
+        arriving = {}  # intersection -> lanes that end there
+        leaving = {}  # intersection -> lanes that start there
+        road_ids = itertools.count(1)
+        for i in range(grid):
+            for j in range(grid):
+                for ni, nj in ((i + 1, j), (i, j + 1)):
+                    if ni < grid and nj < grid:
+                        road_id = next(road_ids)
+                        self._add_road(road_id, (i, j), (ni, nj), 1, arriving, leaving)
+                        self._add_road(road_id, (ni, nj), (i, j), -1, arriving, leaving)
+
+        junction_ids = itertools.count(10000)
+        for node, incoming in arriving.items():
+            for lane_in in incoming:
+                for lane_out in leaving.get(node, []):
+                    if abs(abs(lane_out.yaw - lane_in.yaw) - 180.0) < 1.0:
+                        continue  # No U-turns
+                    connector = _Lane(len(self.lanes), next(junction_ids), -1, lane_in.end, lane_out.start,
+                                      is_junction=True)
+                    connector.successors.append(lane_out)
+                    lane_in.successors.append(connector)
+                    self.lanes.append(connector)
+        self._driving = [lane for lane in self.lanes if not lane.is_junction]
+
+    def _add_road(self, road_id, a, b, lane_id, arriving, leaving):
+        ax, ay = a[0] * BLOCK_SIZE, a[1] * BLOCK_SIZE
+        bx, by = b[0] * BLOCK_SIZE, b[1] * BLOCK_SIZE
+        length = math.hypot(bx - ax, by - ay)
+        dx, dy = (bx - ax) / length, (by - ay) / length
+        # Drive on the right: offset half a lane to the right of the direction of travel
+        ox, oy = -dy * LANE_WIDTH / 2, dx * LANE_WIDTH / 2
+        start = Location(ax + dx * JUNCTION_INSET + ox, ay + dy * JUNCTION_INSET + oy, 0.0)
+        end = Location(bx - dx * JUNCTION_INSET + ox, by - dy * JUNCTION_INSET + oy, 0.0)
+        lane = _Lane(len(self.lanes), road_id, lane_id, start, end)
+        self.lanes.append(lane)
+        leaving.setdefault(a, []).append(lane)
+        arriving.setdefault(b, []).append(lane)
+
+    def get_spawn_points(self):
+        points = []
+        for lane in self._driving:
+            s = SPAWN_SPACING
+            while s < lane.length - SPAWN_SPACING / 2:
+                location = lane.location(s)
+                points.append(Transform(Location(location.x, location.y, 0.5), Rotation(yaw=lane.yaw)))
+                s += SPAWN_SPACING
+        return points
+
+    def get_waypoint(self, location, project_to_road=True):
+        lanes = self._driving if project_to_road else self.lanes
+        best = min(((lane,) + lane.project(location) for lane in lanes), key=lambda item: item[2])
+        lane, s, distance_sq = best
+        if not project_to_road and distance_sq > (LANE_WIDTH / 2) ** 2:
+            return None
+        return Waypoint(lane, s)
+
+    def get_topology(self):
+        return [(Waypoint(lane, 0.0), Waypoint(lane, lane.length)) for lane in self.lanes]
+
+    def generate_waypoints(self, distance):
+        waypoints = []
+        for lane in self.lanes:
+            s = 0.0
+            while s < lane.length:
+                waypoints.append(Waypoint(lane, s))
+                s += distance
+        return waypoints
+
+
+_frames = {}  # (width, height) -> synthetic BGRA images
+_frames_lock = threading.Lock()
+
+
+def synthetic_frames(width, height):
+    """A few BGRA images with a bright square crossing a dark background, shared by all cameras of one size"""
+    with _frames_lock:
+        if (width, height) not in _frames:
+            frames = []
+            size = max(8, min(width, height) // 6)
+            for k in range(FRAME_VARIANTS):
+                image = np.full((height, width, 4), 40, dtype=np.uint8)
+                image[:, :, 3] = 255
+                x = (width - size) * k // max(1, FRAME_VARIANTS - 1)
+                y = (height - size) // 2
+                image[y:y + size, x:x + size, :3] = 230
+                frames.append(image.tobytes())
+            _frames[(width, height)] = frames
+        return _frames[(width, height)]
+
+
+class Image:
+    def __init__(self, frame, timestamp, transform, width, height, fov, raw_data):
+        self.frame = frame
+        self.timestamp = timestamp
+        self.transform = transform
+        self.width = width
+        self.height = height
+        self.fov = fov
+        self.raw_data = raw_data
+
+
+class Actor:
+    def __init__(self, world, blueprint, transform, parent=None):
+        self.id = next(_actor_ids)
+        self.type_id = blueprint.id
+        self.attributes = dict(blueprint._attributes)
+        self.parent = parent
+        self.is_alive = True
+        self._world = world
+        self._transform = Transform(Location(transform.location.x, transform.location.y, transform.location.z),
+                                    Rotation(transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll))
+
+    def get_world(self):
+        return self._world
+
+    def get_transform(self):
+        return self._transform
+
+    def get_location(self):
+        return self._transform.location
+
+    def get_velocity(self):
+        return Vector3D()
+
+    def destroy(self):
+        _rpc()
+        return self._world._remove(self)
+
+
+class Vehicle(Actor):
+    """Kinematic bicycle model, advanced by the world on every tick"""
+
+    def __init__(self, world, blueprint, transform, parent=None):
+        super().__init__(world, blueprint, transform, parent)
+        self.speed = 0.0  # Signed, negative in reverse
+        self._velocity = Vector3D()
+        self._control = VehicleControl()
+
+    def get_velocity(self):
+        return self._velocity
+
+    def get_control(self):
+        return self._control
+
+    def apply_control(self, control):
+        _rpc()
+        self._control = control
+
+    def _advance(self, dt):
+        c = self._control
+        direction = -1.0 if c.reverse else 1.0
+        accel = direction * 4.0 * min(max(c.throttle, 0.0), 1.0)
+        braking = 8.0 * min(max(c.brake, 0.0), 1.0) + (10.0 if c.hand_brake else 0.0) + 0.3 + 0.05 * abs(self.speed)
+        speed = self.speed + accel * dt
+        # Braking and drag only slow the vehicle down, never push it backwards
+        slowed = max(abs(speed) - braking * dt, 0.0)
+        speed = math.copysign(min(slowed, MAX_SPEED), speed)
+        rotation = self._transform.rotation
+        yaw_rate = speed / WHEELBASE * math.tan(min(max(c.steer, -1.0), 1.0) * MAX_STEER_ANGLE)
+        yaw = (rotation.yaw + math.degrees(yaw_rate * dt) + 180.0) % 360.0 - 180.0
+        heading = math.radians(yaw)
+        self._velocity = Vector3D(speed * math.cos(heading), speed * math.sin(heading), 0.0)
+        location = self._transform.location
+        # A new transform each tick, so a reader never sees a half-updated one
+        self._transform = Transform(
+            Location(location.x + self._velocity.x * dt, location.y + self._velocity.y * dt, location.z),
+            Rotation(rotation.pitch, yaw, rotation.roll))
+        self.speed = speed
+
+
+class Camera(Actor):
+    """RGB camera that delivers synthetic frames on the world's ticks, every sensor_tick simulated seconds"""
+
+    def __init__(self, world, blueprint, transform, parent=None):
+        super().__init__(world, blueprint, transform, parent)
+        self.width = int(self.attributes.get("image_size_x", 800))
+        self.height = int(self.attributes.get("image_size_y", 600))
+        self.fov = float(self.attributes.get("fov", 90.0))
+        interval = float(self.attributes.get("sensor_tick", 0.0))
+        if FAKE_CAMERA_FPS > 0:
+            interval = max(interval, 1.0 / FAKE_CAMERA_FPS)
+        self.interval = interval
+        self.frames_dropped = 0
+        self._callback = None
+        self._next_capture = 0.0
+        self._busy = False
+        self._lock = threading.Lock()
+
+    def get_transform(self):
+        if self.parent is None:
+            return self._transform
+        parent = self.parent.get_transform()
+        yaw = math.radians(parent.rotation.yaw)
+        local = self._transform.location
+        return Transform(
+            Location(parent.location.x + local.x * math.cos(yaw) - local.y * math.sin(yaw),
+                     parent.location.y + local.x * math.sin(yaw) + local.y * math.cos(yaw),
+                     parent.location.z + local.z),
+            Rotation(self._transform.rotation.pitch, parent.rotation.yaw + self._transform.rotation.yaw, 0.0))
+
+    def get_location(self):
+        return self.get_transform().location
+
+    def listen(self, callback):
+        _rpc()
+        with self._lock:
+            self._callback = callback
+
+    def stop(self):
+        _rpc()
+        with self._lock:
+            self._callback = None
+
+    def is_listening(self):
+        return self._callback is not None
+
+    def _capture(self, timestamp, executor):
+        # Called from the tick; the callback itself runs on a sensor thread like the real client's
+        with self._lock:
+            callback = self._callback
+            if callback is None or timestamp.elapsed_seconds + 1e-9 < self._next_capture:
+                return
+            self._next_capture = timestamp.elapsed_seconds + self.interval
+            if self._busy:
+                self.frames_dropped += 1  # The previous frame's callback is still running
+                return
+            self._busy = True
+        frames = synthetic_frames(self.width, self.height)
+        image = Image(timestamp.frame, timestamp.elapsed_seconds, self.get_transform(), self.width, self.height,
+                      self.fov, frames[timestamp.frame % len(frames)])
+        executor.submit(self._deliver, callback, image)
+
+    def _deliver(self, callback, image):
+        try:
+            callback(image)
+        except Exception as e:
+            print(f"⚠️ Fake camera {self.id} callback failed: {e}")
+        finally:
+            with self._lock:
+                self._busy = False
+
+
+class ActorSnapshot:
+    def __init__(self, actor):
+        self.id = actor.id
+        self._transform = actor.get_transform()
+        self._velocity = actor.get_velocity()
+
+    def get_transform(self):
+        return self._transform
+
+    def get_velocity(self):
+        return self._velocity
+
+
+class WorldSnapshot:
+    def __init__(self, frame, timestamp, actors):
+        self.id = 1
+        self.frame = frame
+        self.timestamp = timestamp
+        self._actors = {actor.id: ActorSnapshot(actor) for actor in actors}
+
+    def find(self, actor_id):
+        return self._actors.get(actor_id)
+
+    def has_actor(self, actor_id):
+        return actor_id in self._actors
+
+    def __iter__(self):
+        return iter(self._actors.values())
+
+    def __len__(self):
+        return len(self._actors)
+
+
+class World:
+    """One simulated server: advances itself in real time, or only on tick() in synchronous mode"""
+
+    def __init__(self, grid=FAKE_GRID):
+        self.id = next(_actor_ids)
+        self._map = Map(grid)
+        self._settings = WorldSettings()
+        self._lock = threading.RLock()
+        self._actors = {}
+        self._callbacks = {}
+        self._callback_ids = itertools.count(1)
+        self._ticked = threading.Condition(self._lock)
+        self._sensor_executor = ThreadPoolExecutor(max_workers=max(1, FAKE_SENSOR_THREADS),
+                                                   thread_name_prefix="fake-carla-sensor")
+        self._snapshot = WorldSnapshot(0, Timestamp(0, 0.0, 0.0), [])
+        threading.Thread(target=self._run, name="fake-carla-world", daemon=True).start()
+
+    def _delta(self):
+        return self._settings.fixed_delta_seconds or FAKE_DELTA
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            delta = self._delta()
+            next_tick += delta
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()  # Fell behind: tick late rather than in a burst
+            if not self._settings.synchronous_mode:
+                self._step(delta)
+
+    def _step(self, delta):
+        with self._lock:
+            previous = self._snapshot.timestamp
+            timestamp = Timestamp(previous.frame + 1, previous.elapsed_seconds + delta, delta)
+            actors = list(self._actors.values())
+            for actor in actors:
+                if isinstance(actor, Vehicle):
+                    actor._advance(delta)
+            self._snapshot = snapshot = WorldSnapshot(timestamp.frame, timestamp, actors)
+            self._ticked.notify_all()
+            callbacks = list(self._callbacks.values())
+        for actor in actors:
+            if isinstance(actor, Camera):
+                actor._capture(timestamp, self._sensor_executor)
+        for callback in callbacks:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"⚠️ Fake world on_tick callback failed: {e}")
+        return timestamp.frame
+
+    def tick(self, seconds=10.0):
+        _rpc()
+        if not self._settings.synchronous_mode:
+            raise RuntimeError("tick() is only allowed in synchronous mode")
+        return self._step(self._delta())
+
+    def wait_for_tick(self, seconds=10.0):
+        with self._lock:
+            frame = self._snapshot.frame
+            if not self._ticked.wait_for(lambda: self._snapshot.frame != frame, seconds):
+                raise RuntimeError(f"time-out of {seconds}s while waiting for the simulator")
+            return self._snapshot
+
+    def on_tick(self, callback):
+        with self._lock:
+            callback_id = next(self._callback_ids)
+            self._callbacks[callback_id] = callback
+        return callback_id
+
+    def remove_on_tick(self, callback_id):
+        with self._lock:
+            self._callbacks.pop(callback_id, None)
+
+    def get_snapshot(self):
+        return self._snapshot
+
+    def get_map(self):
+        _rpc()
+        return self._map
+
+    def get_blueprint_library(self):
+        _rpc()
+        return _blueprint_library()
+
+    def get_settings(self):
+        _rpc()
+        s = self._settings
+        return WorldSettings(s.synchronous_mode, s.fixed_delta_seconds, s.no_rendering_mode)
+
+    def apply_settings(self, settings):
+        _rpc()
+        self._settings = WorldSettings(settings.synchronous_mode, settings.fixed_delta_seconds,
+                                       settings.no_rendering_mode)
+        return self._snapshot.frame
+
+    def _spawn(self, blueprint, transform, attach_to=None):
+        # Returns the actor, or None when a vehicle would overlap another one
+        with self._lock:
+            if blueprint.id.startswith("vehicle."):
+                for actor in self._actors.values():
+                    if isinstance(actor, Vehicle) and actor.get_location().distance(transform.location) < 2.0:
+                        return None
+                actor = Vehicle(self, blueprint, transform, attach_to)
+            elif blueprint.id.startswith("sensor.camera"):
+                actor = Camera(self, blueprint, transform, attach_to)
+            else:
+                actor = Actor(self, blueprint, transform, attach_to)
+            self._actors[actor.id] = actor
+            return actor
+
+    def try_spawn_actor(self, blueprint, transform, attach_to=None):
+        _rpc()
+        return self._spawn(blueprint, transform, attach_to)
+
+    def spawn_actor(self, blueprint, transform, attach_to=None):
+        _rpc()
+        actor = self._spawn(blueprint, transform, attach_to)
+        if actor is None:
+            raise RuntimeError("Spawn failed because of collision at spawn position")
+        return actor
+
+    def _remove(self, actor):
+        with self._lock:
+            removed = self._actors.pop(actor.id, None) is not None
+        if removed:
+            actor.is_alive = False
+            if isinstance(actor, Camera):
+                actor._callback = None
+        return removed
+
+    def get_actor(self, actor_id):
+        _rpc()
+        with self._lock:
+            return self._actors.get(actor_id)
+
+    def get_actors(self, actor_ids=None):
+        _rpc()
+        with self._lock:
+            if actor_ids is None:
+                return list(self._actors.values())
+            return [self._actors[i] for i in actor_ids if i in self._actors]
+
+
+class command:
+    """Batch commands for Client.apply_batch and apply_batch_sync"""
+
+    class Response:
+        def __init__(self, actor_id=0, error=""):
+            self.actor_id = actor_id
+            self.error = error
+
+        def has_error(self):
+            return bool(self.error)
+
+    class SpawnActor:
+        def __init__(self, blueprint, transform, parent=None):
+            self.blueprint = blueprint
+            self.transform = transform
+            self.parent = parent
+
+    class DestroyActor:
+        def __init__(self, actor):
+            self.actor_id = actor if isinstance(actor, int) else actor.id
+
+    class ApplyVehicleControl:
+        def __init__(self, actor, control):
+            self.actor_id = actor if isinstance(actor, int) else actor.id
+            self.control = control
+
+
+_worlds = {}  # (host, port) -> World
+_worlds_lock = threading.Lock()
+
+
+def get_world(host, port):
+    """The simulated world behind an endpoint, created on first use"""
+    with _worlds_lock:
+        if (host, port) not in _worlds:
+            world = _worlds[(host, port)] = World()
+            print(f"🧪 Fake CARLA world {world.get_map().name} at {host}:{port}")
+        return _worlds[(host, port)]
+
+
+class Client:
+    def __init__(self, host="localhost", port=2000, worker_threads=0):
+        _rpc()
+        self.host = host
+        self.port = port
+        self._world = get_world(host, port)
+        self.timeout = 5.0
+
+    def set_timeout(self, seconds):
+        self.timeout = seconds
+
+    def get_world(self):
+        _rpc()
+        return self._world
+
+    def get_server_version(self):
+        return "0.9.15-fake"
+
+    def get_client_version(self):
+        return "0.9.15-fake"
+
+    def _execute(self, commands):
+        responses = []
+        world = self._world
+        for c in commands:
+            if isinstance(c, command.SpawnActor):
+                actor = world._spawn(c.blueprint, c.transform, world._actors.get(c.parent) if c.parent else None)
+                responses.append(command.Response(actor.id) if actor else
+                                 command.Response(0, "Spawn failed because of collision at spawn position"))
+            elif isinstance(c, command.DestroyActor):
+                actor = world._actors.get(c.actor_id)
+                destroyed = actor is not None and world._remove(actor)
+                responses.append(command.Response(c.actor_id, "" if destroyed else f"actor {c.actor_id} not found"))
+            elif isinstance(c, command.ApplyVehicleControl):
+                actor = world._actors.get(c.actor_id)
+                if isinstance(actor, Vehicle):
+                    actor._control = c.control
+                    responses.append(command.Response(c.actor_id))
+                else:
+                    responses.append(command.Response(c.actor_id, f"actor {c.actor_id} not found"))
+            else:
+                responses.append(command.Response(0, f"unsupported command {type(c).__name__}"))
+        return responses
+
+    def apply_batch(self, commands):
+        _rpc()
+        self._execute(commands)
+
+    def apply_batch_sync(self, commands, do_tick=False):
+        _rpc()
+        responses = self._execute(commands)
+        if do_tick and self._world._settings.synchronous_mode:
+            self._world._step(self._world._delta())
+        return responses
@@ -0,0 +1,186 @@
+import os
+import random
+import threading
+import numpy as np
+from carla_connection import carla
+
+
+VEHICLE_BLUEPRINT = "vehicle.tesla.model3"
+SPAWN_CLEARANCE = 5.0  # Metres between a free spawn point and any vehicle we placed
+ORPHAN_RADIUS = 1.0  # Metres around a spawn point where an untracked vehicle of ours counts as left behind
+# Seconds the client waits for one SpawnActor batch; large synchronous batches outlast the default timeout
+BULK_SPAWN_TIMEOUT = float(os.environ.get("CARLA_BULK_SPAWN_TIMEOUT", "30.0"))
+
+
+class FleetSpawner:
+    """Spawns vehicles for many robots in one batched round trip
+
+    Blueprints and spawn points are fetched once per map, and an occupancy
+    index remembers which spawn points our robots were placed on, so bulk
+    spawns only try points that are likely free.
+    """
+    _instances = {}  # Dictionary to store spawners by server endpoint
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, connection):
+        """Get or create the spawner for the server behind a connection"""
+        with cls._instances_lock:
+            if connection.endpoint not in cls._instances:
+                cls._instances[connection.endpoint] = cls(connection)
+            return cls._instances[connection.endpoint]
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._lock = threading.Lock()
+        self._map_name = None
+        self._blueprints = {}  # filter -> blueprint
+        self._spawn_points = []
+        self._spawn_locations = np.empty((0, 3))
+        self._occupied = {}  # robot_id -> (x, y, z) where its vehicle was placed
+        self._vehicle_ids = {}  # robot_id -> actor id of its vehicle
+
+    def _refresh(self):
+        # Caller holds the lock; caches are dropped when the server loads another map
+        carla_map = self.connection.map
+        if carla_map.name != self._map_name:
+            self._spawn_points = carla_map.get_spawn_points()
+            self._spawn_locations = np.array([[t.location.x, t.location.y, t.location.z]
+                                              for t in self._spawn_points], dtype=np.float64).reshape(-1, 3)
+            self._blueprints = {}
+            self._occupied = {}
+            self._vehicle_ids = {}
+            self._map_name = carla_map.name
+
+    def blueprint(self, blueprint_filter=VEHICLE_BLUEPRINT):
+        """First blueprint matching a filter, or None"""
+        with self._lock:
+            self._refresh()
+            if blueprint_filter not in self._blueprints:
+                matches = self.connection.bp_lib.filter(blueprint_filter)
+                self._blueprints[blueprint_filter] = matches[0] if matches else None
+            return self._blueprints[blueprint_filter]
+
+    def spawn_points(self):
+        with self._lock:
+            self._refresh()
+            return list(self._spawn_points)
+
+    def occupy(self, robot_id, vehicle, location):
+        with self._lock:
+            self._occupied[robot_id] = (location.x, location.y, location.z)
+            self._vehicle_ids[robot_id] = vehicle.id
+
+    def release(self, robot_id):
+        with self._lock:
+            self._occupied.pop(robot_id, None)
+            self._vehicle_ids.pop(robot_id, None)
+
+    def reconcile(self, blueprint, transforms):
+        """Destroy vehicles a failed spawn left at these transforms that no robot owns; returns how many
+
+        A spawn RPC can fail after the server already created the actors, e.g. on a client
+        timeout, so the world is checked instead of sending the spawn again.
+        """
+        try:
+            with self._lock:
+                tracked = set(self._vehicle_ids.values())
+            points = np.array([[t.location.x, t.location.y] for t in transforms], dtype=np.float64).reshape(-1, 2)
+            orphans = []
+            for actor in self.connection.world.get_actors():
+                if actor.type_id != blueprint.id or actor.id in tracked:
+                    continue
+                location = actor.get_location()
+                d2 = np.sum((points - (location.x, location.y)) ** 2, axis=1)
+                if np.any(d2 < ORPHAN_RADIUS ** 2):
+                    orphans.append(actor.id)
+            if orphans:
+                self.connection.client.apply_batch_sync([carla.command.DestroyActor(i) for i in orphans], False)
+                print(f"🧹 Destroyed {len(orphans)} vehicles left behind by a failed spawn")
+            return len(orphans)
+        except Exception as e:
+            print(f"⚠️ Could not clean up after a failed spawn: {e}")
+            return 0
+
+    def free_spawn_points(self, exclude=()):
+        """Spawn points with no vehicle of ours (or excluded location) within SPAWN_CLEARANCE, in random order"""
+        with self._lock:
+            self._refresh()
+            free = np.ones(len(self._spawn_points), dtype=bool)
+            taken = list(self._occupied.values()) + [(l.x, l.y, l.z) for l in exclude]
+            if taken and len(free):
+                taken = np.array(taken, dtype=np.float64)
+                d2 = np.sum((self._spawn_locations[:, None, :2] - taken[None, :, :2]) ** 2, axis=2)
+                free = ~np.any(d2 < SPAWN_CLEARANCE ** 2, axis=1)
+            points = [self._spawn_points[i] for i in np.nonzero(free)[0]]
+        random.shuffle(points)
+        return points
+
+    def spawn(self, controllers, blueprint_filter=VEHICLE_BLUEPRINT, retries=1):
+        """Spawn a vehicle for every controller without one; returns {robot_id: message}"""
+        # Robots another request is spawning right now are skipped, so no robot ever gets two vehicles
+        locked = [c for c in controllers if c.spawn_lock.acquire(blocking=False)]
+        try:
+            results = {c.robot_id: "Spawn already in progress." for c in controllers if c not in locked}
+            results.update(self._spawn(locked, blueprint_filter, retries))
+            return results
+        finally:
+            for c in locked:
+                c.spawn_lock.release()
+
+    def _spawn(self, controllers, blueprint_filter, retries):
+        # Caller holds the spawn_lock of every controller
+        results = {}
+        pending = [c for c in controllers if c.vehicle is None]
+        for c in controllers:
+            if c.vehicle is not None:
+                results[c.robot_id] = "Vehicle already spawned."
+        blueprint = self.blueprint(blueprint_filter)
+        if blueprint is None:
+            return dict(results, **{c.robot_id: "No matching blueprint found." for c in pending})
+
+        blocked = []  # Points that failed, e.g. taken by actors we do not manage
+        for _ in range(retries + 1):
+            if not pending:
+                break
+            points = self.free_spawn_points(blocked)
+            if not points:
+                break
+            assigned = list(zip(pending, points))
+            pending = pending[len(assigned):]
+            batch = [carla.command.SpawnActor(blueprint, transform) for _, transform in assigned]
+            try:
+                responses = self._apply_spawn_batch(batch)
+            except RuntimeError as e:
+                # Never replayed: the server may have spawned the batch before the call failed
+                print(f"❌ Spawn batch of {len(batch)} vehicles failed: {e}")
+                self.reconcile(blueprint, [transform for _, transform in assigned])
+                for controller in [c for c, _ in assigned] + pending:
+                    results[controller.robot_id] = f"❌ Spawn batch failed: {e}"
+                return results
+
+            # One more round trip resolves every new actor id
+            spawned_ids = [r.actor_id for r in responses if not r.has_error()]
+            actors = {a.id: a for a in self.connection.world.get_actors(spawned_ids)} if spawned_ids else {}
+            for (controller, transform), response in zip(assigned, responses):
+                actor = None if response.has_error() else actors.get(response.actor_id)
+                if actor is None:
+                    # Someone else is on that point; it gets another try with a different one
+                    blocked.append(transform.location)
+                    pending.append(controller)
+                    continue
+                controller.vehicle = actor
+                self.occupy(controller.robot_id, actor, transform.location)
+                results[controller.robot_id] = f"Vehicle spawned at {transform.location}"
+
+        for controller in pending:
+            results[controller.robot_id] = "Failed to spawn vehicle from all available spawn points."
+        return results
+
+    def _apply_spawn_batch(self, batch):
+        client = self.connection.client
+        client.set_timeout(max(self.connection.timeout, BULK_SPAWN_TIMEOUT))
+        try:
+            return client.apply_batch_sync(batch, False)
+        finally:
+            client.set_timeout(self.connection.timeout)
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+
+ENCODER_WORKERS = int(os.environ.get("CARLA_ENCODER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def encode_jpeg(image, quality=None):
+    """Encode a CARLA BGRA image as JPEG bytes"""
+    array = np.frombuffer(image.raw_data, dtype=np.uint8)
+    array = array.reshape((image.height, image.width, 4))[:, :, :3]
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)] if quality else []
+    ok, buffer = cv2.imencode('.jpg', array, params)
+    if not ok:
+        raise RuntimeError("cv2.imencode failed")
+    return buffer.tobytes()
+
+
+class FrameEncoderPool:
+    """Bounded pool of JPEG encoder threads with one "latest frame wins" slot per camera
+
+    cv2.imencode releases the GIL, so a few threads encode in parallel without
+    the pickling cost a process pool would add for every raw frame.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(ENCODER_WORKERS)
+            return cls._instance
+
+    def __init__(self, workers=ENCODER_WORKERS):
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._pending = {}  # key -> (image, on_encoded, quality, submitted_at)
+        self._ready = deque()  # Keys with a pending frame and no encode in flight
+        self._busy = set()  # Keys currently being encoded, kept serial per camera
+        self._stats = {}
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"frame-encoder-{i}", daemon=True).start()
+
+    def submit(self, key, image, on_encoded, quality=None):
+        """Hand a raw frame off for encoding; an older frame still waiting for the same key is dropped"""
+        with self._cond:
+            stats = self._stats_for(key)
+            stats["submitted"] += 1
+            if key in self._pending:
+                stats["dropped"] += 1
+            elif key not in self._busy:
+                self._ready.append(key)
+            self._pending[key] = (image, on_encoded, quality, time.perf_counter())
+            self._cond.notify()
+
+    def discard(self, key):
+        """Drop any frame still waiting for a key, e.g. when its camera is detached"""
+        with self._cond:
+            if self._pending.pop(key, None) is not None:
+                self._stats_for(key)["dropped"] += 1
+                if key in self._ready:
+                    self._ready.remove(key)
+
+    def forget(self, key):
+        self.discard(key)
+        with self._cond:
+            self._stats.pop(key, None)
+
+    def get_stats(self, key=None):
+        with self._cond:
+            if key is not None:
+                return dict(self._stats.get(key) or self._new_stats())
+            return {k: dict(v) for k, v in self._stats.items()}
+
+    @staticmethod
+    def _new_stats():
+        return {
+            "submitted": 0,
+            "encoded": 0,
+            "dropped": 0,  # Replaced by a newer frame before being encoded
+            "errors": 0,
+            "last_encode_ms": 0.0,
+            "avg_encode_ms": 0.0,  # Exponential moving average
+            "max_encode_ms": 0.0,
+            "last_latency_ms": 0.0,  # Hand-off to encoded, including time spent waiting
+        }
+
+    def _stats_for(self, key):
+        if key not in self._stats:
+            self._stats[key] = self._new_stats()
+        return self._stats[key]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._ready:
+                    self._cond.wait()
+                key = self._ready.popleft()
+                image, on_encoded, quality, submitted_at = self._pending.pop(key)
+                self._busy.add(key)
+
+            started = time.perf_counter()
+            try:
+                jpeg = encode_jpeg(image, quality)
+                error = None
+            except Exception as e:
+                jpeg, error = None, e
+            finished = time.perf_counter()
+            del image  # Release the CARLA buffer before publishing
+
+            if jpeg is not None:
+                try:
+                    on_encoded(jpeg)
+                except Exception as e:
+                    error = e
+
+            with self._cond:
+                self._busy.discard(key)
+                if key in self._pending:
+                    self._ready.append(key)
+                    self._cond.notify()
+                stats = self._stats.get(key)
+                if stats is None:
+                    continue
+                if error is not None:
+                    stats["errors"] += 1
+                    print(f"❌ Frame encoding error for {key}: {error}")
+                    continue
+                encode_ms = (finished - started) * 1000.0
+                stats["encoded"] += 1
+                stats["last_encode_ms"] = encode_ms
+                stats["avg_encode_ms"] = encode_ms if stats["encoded"] == 1 else 0.9 * stats["avg_encode_ms"] + 0.1 * encode_ms
+                stats["max_encode_ms"] = max(stats["max_encode_ms"], encode_ms)
+                stats["last_latency_ms"] = (finished - submitted_at) * 1000.0
@@ -0,0 +1,156 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import numpy as np
+
+
+ROUTE_CACHE_DIR = os.environ.get("CARLA_ROUTE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "carla_controller"))
+ROUTE_RESOLUTION = 2.0  # Metres between route points
+
+
+class RoutePlanner:
+    """Road graph built once per map from map.get_topology(), answering A* route queries in-process
+
+    Nodes are lane segment endpoints, edges are lane segments with a dense
+    polyline. The graph is cached on disk keyed by map name, so later runs
+    skip the topology walk entirely.
+    """
+    _instances = {}  # Dictionary to store planners by map name
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_map(cls, carla_map, resolution=ROUTE_RESOLUTION, cache_dir=ROUTE_CACHE_DIR):
+        """Get the planner for a map, loading the graph from disk or building it on first use"""
+        key = (carla_map.name, resolution)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls._load_or_build(carla_map, resolution, cache_dir)
+            return cls._instances[key]
+
+    @classmethod
+    def _load_or_build(cls, carla_map, resolution, cache_dir):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", carla_map.name)
+        path = os.path.join(cache_dir, f"route_graph_{safe_name}_{resolution:g}.json") if cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    planner = cls(carla_map.name, resolution, **json.load(f))
+                print(f"🗺️ Loaded road graph for {carla_map.name} from {path}")
+                return planner
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable road graph cache {path}: {e}")
+
+        planner = cls.build(carla_map, resolution)
+        if path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"nodes": planner.nodes.tolist(), "edges": planner.edges}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ Could not cache road graph to {path}: {e}")
+        return planner
+
+    @classmethod
+    def build(cls, carla_map, resolution=ROUTE_RESOLUTION):
+        """Walk every topology segment once and sample it every `resolution` metres"""
+        node_ids = {}
+        nodes = []
+        edges = []
+
+        def node_for(location):
+            key = (round(location.x, 1), round(location.y, 1), round(location.z, 1))
+            if key not in node_ids:
+                node_ids[key] = len(nodes)
+                nodes.append([location.x, location.y, location.z])
+            return node_ids[key]
+
+        for entry, exit_wp in carla_map.get_topology():
+            start = entry.transform.location
+            end = exit_wp.transform.location
+            points = [[start.x, start.y, start.z]]
+            waypoint = entry
+            max_steps = int(start.distance(end) / resolution) * 2 + 20
+            for _ in range(max_steps):
+                candidates = waypoint.next(resolution)
+                if not candidates:
+                    break
+                waypoint = min(candidates, key=lambda w: w.transform.location.distance(end))
+                location = waypoint.transform.location
+                if location.distance(end) < resolution:
+                    break
+                points.append([location.x, location.y, location.z])
+            points.append([end.x, end.y, end.z])
+            length = float(np.linalg.norm(np.diff(np.asarray(points), axis=0), axis=1).sum())
+            edges.append([node_for(start), node_for(end), length, points])
+
+        print(f"🗺️ Built road graph for {carla_map.name}: {len(nodes)} nodes, {len(edges)} edges")
+        return cls(carla_map.name, resolution, nodes, edges)
+
+    def __init__(self, map_name, resolution, nodes, edges):
+        self.map_name = map_name
+        self.resolution = resolution
+        self.nodes = np.asarray(nodes, dtype=np.float64).reshape(-1, 3)
+        self.edges = edges  # [from_node, to_node, length, [[x, y, z], ...]]
+        self._outgoing = [[] for _ in range(len(self.nodes))]
+        for index, (u, _, _, _) in enumerate(edges):
+            self._outgoing[u].append(index)
+        # Flattened polyline points for nearest-point lookups
+        self._points = np.array([p for edge in edges for p in edge[3]], dtype=np.float64).reshape(-1, 3)
+        self._point_edge = np.array([i for i, edge in enumerate(edges) for _ in edge[3]], dtype=np.int64)
+        self._point_offset = np.array([j for edge in edges for j in range(len(edge[3]))], dtype=np.int64)
+
+    def nearest(self, x, y, z=0.0):
+        """(edge index, point index) of the route point closest to a position"""
+        d = np.sum((self._points - (x, y, z)) ** 2, axis=1)
+        i = int(np.argmin(d))
+        return int(self._point_edge[i]), int(self._point_offset[i])
+
+    def _shortest_path(self, source, target):
+        """A* over nodes with straight-line distance as heuristic; returns a list of edge indices or None"""
+        goal = self.nodes[target]
+        best = {source: 0.0}
+        previous = {}
+        frontier = [(float(np.linalg.norm(self.nodes[source] - goal)), 0.0, source)]
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            if node == target:
+                path = []
+                while node != source:
+                    edge = previous[node]
+                    path.append(edge)
+                    node = self.edges[edge][0]
+                return path[::-1]
+            if cost > best.get(node, math.inf):
+                continue
+            for edge in self._outgoing[node]:
+                nxt = self.edges[edge][1]
+                new_cost = cost + self.edges[edge][2]
+                if new_cost < best.get(nxt, math.inf):
+                    best[nxt] = new_cost
+                    previous[nxt] = edge
+                    heuristic = float(np.linalg.norm(self.nodes[nxt] - goal))
+                    heapq.heappush(frontier, (new_cost + heuristic, new_cost, nxt))
+        return None
+
+    def plan(self, start, destination):
+        """Full route between two carla.Location-like positions as a list of (x, y, z), or None"""
+        start_edge, start_index = self.nearest(start.x, start.y, start.z)
+        goal_edge, goal_index = self.nearest(destination.x, destination.y, destination.z)
+
+        if start_edge == goal_edge and start_index <= goal_index:
+            points = self.edges[start_edge][3][start_index:goal_index + 1]
+            return [tuple(p) for p in points]
+
+        path = self._shortest_path(self.edges[start_edge][1], self.edges[goal_edge][0])
+        if path is None:
+            return None
+        points = list(self.edges[start_edge][3][start_index:])
+        for edge in path:
+            points.extend(self.edges[edge][3][1:])
+        points.extend(self.edges[goal_edge][3][1:goal_index + 1])
+        return [tuple(p) for p in points]
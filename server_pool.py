@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from carla_connection import CarlaConnection, CARLA_HOST, CARLA_PORT
+
+
+def parse_servers(spec):
+    """["host:port", ...] from a comma-separated list; a bare host uses CARLA_PORT"""
+    servers = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(":") if ":" in item else (item, "", str(CARLA_PORT))
+        servers.append(f"{host}:{int(port)}")
+    return servers
+
+
+# Simulator endpoints robots can be placed on, e.g. CARLA_SERVERS=localhost:2000,localhost:3000
+CARLA_SERVERS = parse_servers(os.environ.get("CARLA_SERVERS", f"{CARLA_HOST}:{CARLA_PORT}"))
+PLACEMENT_METRIC = os.environ.get("CARLA_PLACEMENT", "actors")  # "actors" or "tick_rate"
+LOAD_REFRESH = 2.0  # Seconds a measured server load is reused
+RETRY_INTERVAL = 10.0  # Seconds before placement tries an unreachable server again
+
+
+class ServersDraining(RuntimeError):
+    """Every configured CARLA server is draining, so a new robot has nowhere to go"""
+
+
+class ServerPool:
+    """Places each new robot on the least-loaded CARLA server that is not draining
+
+    Load is the server's actor count, or its measured tick rate with
+    CARLA_PLACEMENT=tick_rate, measured at most every LOAD_REFRESH seconds.
+    Robots placed since the last measurement count towards it, so a burst of
+    creates spreads out instead of landing on one server. Draining a server
+    only stops new placements; robots already on it stay until destroyed.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(CARLA_SERVERS)
+            return cls._instance
+
+    def __init__(self, servers=CARLA_SERVERS, metric=PLACEMENT_METRIC):
+        self.servers = list(servers)
+        self.metric = metric
+        self._lock = threading.Lock()
+        self._draining = set()
+        self._placements = {}  # robot_id -> endpoint
+        self._loads = {}  # endpoint -> (measured at, value, robots placed at that time)
+        self._failed = {}  # endpoint -> time of the last failed connect
+
+    def connection(self, endpoint, timeout=5.0):
+        host, _, port = endpoint.rpartition(":")
+        return CarlaConnection.get_instance(host, int(port), timeout=timeout)
+
+    def _robot_count(self, endpoint):
+        # Caller holds the lock
+        return sum(1 for e in self._placements.values() if e == endpoint)
+
+    def _measure(self, connection):
+        world = connection.world
+        if self.metric == "tick_rate":
+            delta = world.get_snapshot().timestamp.delta_seconds
+            return -(1.0 / delta) if delta else 0.0  # Slower ticking means more loaded
+        return float(len(world.get_actors()))
+
+    def load(self, endpoint, connection):
+        """Sortable load of a server; lower is less loaded"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._loads.get(endpoint)
+        if cached is None or now - cached[0] > LOAD_REFRESH:
+            try:
+                value = connection.call(lambda: self._measure(connection), replay=True)
+            except Exception as e:
+                print(f"⚠️ Could not measure load of {endpoint}: {e}")
+                value = float("inf")
+            with self._lock:
+                cached = self._loads[endpoint] = (now, value, self._robot_count(endpoint))
+        with self._lock:
+            robots = self._robot_count(endpoint)
+        _, value, robots_then = cached
+        if self.metric == "tick_rate":
+            return value, robots
+        return value + max(0, robots - robots_then), robots
+
+    def place(self, robot_id, timeout=5.0):
+        """Connection of the server a new robot should live on, recording the placement
+
+        Returns a disconnected connection when no server can be reached, like
+        CarlaConnection.get_instance does; raises ServersDraining if all are draining.
+        """
+        with self._lock:
+            if robot_id in self._placements:
+                endpoint = self._placements[robot_id]
+                return self.connection(endpoint, timeout)
+            candidates = [e for e in self.servers if e not in self._draining]
+            now = time.monotonic()
+            reachable = [e for e in candidates if now - self._failed.get(e, -RETRY_INTERVAL) >= RETRY_INTERVAL]
+        if not candidates:
+            raise ServersDraining("Every CARLA server is draining, no new robots can be placed")
+
+        live = []
+        for endpoint in reachable or candidates:
+            connection = self.connection(endpoint, timeout)
+            if connection.connected:
+                live.append((endpoint, connection))
+            else:
+                with self._lock:
+                    self._failed[endpoint] = time.monotonic()
+        if not live:
+            return connection
+
+        endpoint, connection = min(live, key=lambda item: self.load(*item))
+        with self._lock:
+            self._placements[robot_id] = endpoint
+        return connection
+
+    def release(self, robot_id):
+        with self._lock:
+            self._placements.pop(robot_id, None)
+
+    def placement(self, robot_id):
+        with self._lock:
+            return self._placements.get(robot_id)
+
+    def placements(self):
+        with self._lock:
+            return dict(self._placements)
+
+    def drain(self, endpoint, draining=True):
+        if endpoint not in self.servers:
+            return f"❌ Unknown server {endpoint}, choose from {self.servers}"
+        with self._lock:
+            if draining:
+                self._draining.add(endpoint)
+            else:
+                self._draining.discard(endpoint)
+        return f"✅ Server {endpoint} {'draining' if draining else 'accepting new robots'}."
+
+    def get_stats(self):
+        """Per-server placement state: connected, draining, robots and last measured load"""
+        with self._lock:
+            stats = {}
+            for endpoint in self.servers:
+                cached = self._loads.get(endpoint)
+                stats[endpoint] = {
+                    "connected": False,
+                    "draining": endpoint in self._draining,
+                    "robots": self._robot_count(endpoint),
+                    "load": cached[1] if cached else None,
+                    "metric": self.metric,
+                }
+        for connection in CarlaConnection.all_instances():
+            if connection.endpoint in stats:
+                stats[connection.endpoint]["connected"] = connection.connected
+        return stats
@@ -0,0 +1,157 @@
+import asyncio
+import queue
+import signal
+import threading
+from multiprocessing.connection import Listener
+from carla_vehicle import CarlaController
+from fleet_telemetry import FleetTelemetry
+from shard_proxy import PROXIED_METHODS
+
+
+def robot_info(controller):
+    """Status flags, vehicle and latest detections of a hosted robot, as reported to the front end"""
+    vehicle = controller.vehicle
+    return {
+        "vehicle_id": vehicle.id if vehicle else None,
+        "vehicle_type": vehicle.type_id if vehicle else None,
+        "server": controller.server,
+        "camera_attached": controller.camera is not None,
+        "telemetry_running": controller.telemetry_running,
+        "streaming": controller.streaming,
+        "camera_paused": controller.camera_paused,
+        "frame_export": controller.frame_exporter.name if controller.frame_exporter else None,
+        "detection_running": controller.detection_running,
+        "navigation_running": controller.navigation_running,
+        "detections": controller.get_detections(),
+    }
+
+
+class ShardWorker:
+    """Hosts the CarlaControllers of one shard and answers front-end requests on a Unix socket
+
+    Every connection gets its own thread and carries one request at a time, so
+    a slow spawn never holds up another robot's command. A "frames" request
+    turns its connection into a one-way video relay for a single robot.
+    """
+
+    def __init__(self, address, authkey):
+        self.listener = Listener(address, family="AF_UNIX", authkey=authkey)
+        # Frame broadcasters are asyncio based, so relayed viewers run on a loop of their own
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="shard-frames", daemon=True).start()
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError) as e:
+                # Failed handshake, e.g. a client with the wrong key
+                print(f"⚠️ Rejected shard connection: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn):
+        try:
+            while True:
+                op, args = conn.recv()
+                if op == "frames":
+                    self._relay_frames(conn, *args)
+                    return
+                try:
+                    reply = ("ok", getattr(self, "op_" + op)(*args))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                conn.send(reply)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _controller(self, robot_id):
+        controller = CarlaController.lookup(robot_id)
+        if controller is None:
+            raise KeyError(f"Robot {robot_id} is not hosted on this shard")
+        return controller
+
+    def op_create(self, robot_id):
+        return robot_info(CarlaController.get_instance(robot_id))
+
+    def op_call(self, robot_id, method, args, kwargs):
+        if method not in PROXIED_METHODS:
+            raise ValueError(f"Method {method} cannot be called remotely")
+        controller = self._controller(robot_id)
+        result = getattr(controller, method)(*args, **kwargs)
+        return result, robot_info(controller)
+
+    def op_submit_control(self, robot_id, control, timeout=1.0):
+        """Queue a control and wait for the fleet loop to apply it; returns (status, latency_ms)"""
+        done = threading.Event()
+        outcome = ["timeout", timeout * 1000.0]
+
+        def ack(status, latency_ms):
+            outcome[:] = [status, latency_ms]
+            done.set()
+        if self._controller(robot_id).submit_control(ack=ack, **control) != "Control queued.":
+            return "rejected", 0.0
+        done.wait(timeout)
+        return tuple(outcome)
+
+    def op_destroy_instance(self, robot_id):
+        return CarlaController.destroy_instance(robot_id)
+
+    def op_spawn_fleet(self, robot_ids):
+        results = CarlaController.spawn_fleet(robot_ids)
+        kept = [CarlaController.lookup(robot_id) for robot_id in robot_ids]
+        return results, {c.robot_id: robot_info(c) for c in kept if c is not None}
+
+    def op_destroy_fleet(self, robot_ids):
+        return CarlaController.destroy_fleet(robot_ids)
+
+    def op_servers(self):
+        return CarlaController.servers()
+
+    def op_drain(self, endpoint, draining):
+        return CarlaController.drain(endpoint, draining)
+
+    def op_state(self):
+        ids, rows = FleetTelemetry.fleet_rows()
+        return ids, rows, {c.robot_id: robot_info(c) for c in CarlaController.registry.controllers()}
+
+    def _relay_frames(self, conn, robot_id):
+        # Counts as one viewer of the robot's broadcaster for as long as the front end keeps the connection
+        try:
+            controller = self._controller(robot_id)
+        except KeyError as e:
+            conn.send(("error", str(e)))
+            return
+        frames = queue.Queue(maxsize=2)
+
+        async def pump():
+            async for _, frame in controller.frame_broadcaster.frames():
+                if frames.full():
+                    try:
+                        frames.get_nowait()  # The relay fell behind: newest frame wins
+                    except queue.Empty:
+                        pass
+                frames.put_nowait(frame)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        conn.send(("ok", None))
+        try:
+            while True:
+                try:
+                    frame = frames.get(timeout=1.0)
+                except queue.Empty:
+                    frame = b""  # Keepalive, so a relay that was stopped or closed is noticed
+                conn.send_bytes(frame)
+        except (EOFError, OSError):
+            pass
+        finally:
+            future.cancel()
+
+
+def serve(address, authkey):
+    """Entry point of a shard worker process"""
+    # The front end decides when workers stop; Ctrl+C in the terminal must not kill them first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ShardWorker(address, authkey).serve_forever()
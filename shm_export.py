@@ -0,0 +1,171 @@
+import re
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from frame_ring import RawFrame
+
+
+# magic, version, width, height, channels, reserved, seqlock, frame_id, timestamp
+HEADER = struct.Struct("<4sIIIIIQQd")
+HEADER_SIZE = 64  # Frame data starts here, leaving room to grow the header
+MAGIC = b"CFRM"
+VERSION = 1
+SEQLOCK_OFFSET = 24
+FRAME_ID_OFFSET = 32
+
+_exported = set()  # Segments exported by this process; its resource tracker registration belongs to the exporter
+_exported_lock = threading.Lock()
+
+
+def segment_name(robot_id):
+    """Shared memory segment name used for a robot's camera"""
+    return "carla_frames_" + re.sub(r"[^A-Za-z0-9_]", "_", str(robot_id))
+
+
+class SharedFrameExporter:
+    """Publishes the latest raw BGR frame of one camera into a shared memory segment
+
+    The header carries a seqlock: the writer makes it odd while copying a frame
+    and even once the frame is complete, so readers in other processes can
+    detect and retry torn reads without any locking or pickling.
+    """
+
+    def __init__(self, name, width, height, channels=3):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.channels = channels
+        size = HEADER_SIZE + width * height * channels
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a previous run that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        with _exported_lock:
+            _exported.add(name)
+        HEADER.pack_into(self._shm.buf, 0, MAGIC, VERSION, width, height, channels, 0, 0, 0, 0.0)
+        self._frame = np.ndarray((height, width, channels), dtype=np.uint8, buffer=self._shm.buf, offset=HEADER_SIZE)
+        self._seqlock = 0
+        self._lock = threading.Lock()  # Keeps close() from racing a write in the sensor thread
+
+    def write_bgra(self, raw_data, frame_id, timestamp):
+        """Copy a CARLA BGRA buffer into the segment, dropping the alpha channel"""
+        source = np.frombuffer(raw_data, dtype=np.uint8).reshape((self.height, self.width, 4))
+        with self._lock:
+            if self._frame is None:
+                return
+            buf = self._shm.buf
+            self._seqlock += 1
+            struct.pack_into("<Q", buf, SEQLOCK_OFFSET, self._seqlock)  # Odd: write in progress
+            np.copyto(self._frame, source[:, :, :self.channels])
+            struct.pack_into("<Qd", buf, FRAME_ID_OFFSET, frame_id, timestamp)
+            self._seqlock += 1
+            struct.pack_into("<Q", buf, SEQLOCK_OFFSET, self._seqlock)  # Even: frame complete
+
+    def close(self):
+        """Release and remove the segment; readers keep their mapping until they close"""
+        with self._lock:
+            if self._frame is None:
+                return
+            self._frame = None
+            self._shm.close()
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            with _exported_lock:
+                _exported.discard(self.name)
+
+
+class SharedFrameReader:
+    """Reads the latest frame exported by SharedFrameExporter, typically from another process
+
+    Example:
+        reader = SharedFrameReader(segment_name("robot1"))
+        frame = reader.wait_for_frame(after_sequence=0, timeout=1.0)
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._shm = _attach(name)
+        magic, version, width, height, channels, _, _, _, _ = HEADER.unpack_from(self._shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self._shm.close()
+            raise ValueError(f"Shared memory segment {name} is not a CARLA frame export")
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self._frame = np.ndarray((height, width, channels), dtype=np.uint8, buffer=self._shm.buf, offset=HEADER_SIZE)
+        self._frame.flags.writeable = False
+
+    def _seqlock(self):
+        return struct.unpack_from("<Q", self._shm.buf, SEQLOCK_OFFSET)[0]
+
+    def read(self, out=None, retries=100):
+        """Consistent copy of the latest frame (into out if given), or None if nothing was written yet
+
+        RawFrame.sequence counts frames written by the exporter.
+        """
+        if out is None:
+            out = np.empty_like(self._frame)
+        for _ in range(retries):
+            before = self._seqlock()
+            if before == 0:
+                return None
+            if before % 2:
+                time.sleep(0)  # Writer is mid-frame, let it finish
+                continue
+            np.copyto(out, self._frame)
+            frame_id, timestamp = struct.unpack_from("<Qd", self._shm.buf, FRAME_ID_OFFSET)
+            if self._seqlock() == before:
+                return RawFrame(before // 2, frame_id, timestamp, out)
+        return None
+
+    def latest_view(self):
+        """Zero-copy (sequence, view) of the frame; confirm with is_current(sequence) after using the view"""
+        before = self._seqlock()
+        if before == 0 or before % 2:
+            return None
+        return before // 2, self._frame
+
+    def is_current(self, sequence):
+        return self._seqlock() == sequence * 2
+
+    def wait_for_frame(self, after_sequence=0, timeout=None, poll_interval=0.005):
+        """Poll until a frame newer than after_sequence is available; returns a copy, or None on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._seqlock() // 2 > after_sequence:
+                frame = self.read()
+                if frame is not None and frame.sequence > after_sequence:
+                    return frame
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def close(self):
+        self._frame = None
+        self._shm.close()
+
+
+def _attach(name):
+    try:
+        # Python 3.13+: readers must not let the resource tracker unlink the exporter's segment
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        with _exported_lock:
+            if name in _exported:
+                # Same process as the exporter: the registration is the exporter's, and its unlink removes it
+                return shm
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+
+def encode_sse(data):
+    """Serialize one update as a Server-Sent Events message"""
+    return f"data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+class TelemetryHub:
+    """Publish/subscribe hub: one producer serializes each update once for every viewer"""
+    _instances = {}  # Dictionary to store hubs by key (usually robot_id); event loop only
+
+    @classmethod
+    def get_instance(cls, key, source, interval=0.05, encode=encode_sse):
+        """Get or create the hub for a key; source() returns the latest data or None"""
+        hub = cls._instances.get(key)
+        if hub is None:
+            hub = cls(key, source, interval, encode)
+            cls._instances[key] = hub
+        return hub
+
+    def __init__(self, key, source, interval=0.05, encode=encode_sse, queue_size=8):
+        self.key = key
+        self.source = source
+        self.interval = interval
+        self.encode = encode
+        self.queue_size = queue_size
+        self.dropped = 0  # Messages discarded because a subscriber fell behind
+        self._subscribers = set()
+        self._producer = None
+        self._last_data = None
+        self._last_payload = None
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        if self._last_payload is not None:
+            # Late joiners get the current state right away
+            queue.put_nowait(self._last_payload)
+        if self._producer is None or self._producer.done():
+            self._producer = asyncio.get_running_loop().create_task(self._produce())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+        if self._subscribers:
+            return
+        # Last viewer gone: stop producing and forget the hub
+        if self._producer is not None:
+            self._producer.cancel()
+            self._producer = None
+        self._last_data = None
+        self._last_payload = None
+        if TelemetryHub._instances.get(self.key) is self:
+            del TelemetryHub._instances[self.key]
+
+    def publish(self, payload):
+        """Deliver the same encoded bytes to every subscriber, dropping their oldest on overflow"""
+        self._last_payload = payload
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(payload)
+
+    async def _produce(self):
+        while self._subscribers:
+            try:
+                # Sources may block (e.g. first-time telemetry start), so they never run on the loop
+                data = await asyncio.get_running_loop().run_in_executor(None, self.source)
+                if data and data != self._last_data:
+                    self._last_data = data
+                    self.publish(self.encode(data))
+            except Exception as e:
+                print(f"❌ Telemetry hub {self.key} producer error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def stream(self):
+        """Yield encoded updates for one subscriber until the client disconnects"""
+        queue = self.subscribe()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            # Runs as soon as the response is cancelled on disconnect
+            self.unsubscribe(queue)
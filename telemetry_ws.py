@@ -0,0 +1,168 @@
+import asyncio
+import json
+import struct
+import time
+import numpy as np
+from fastapi import WebSocketDisconnect
+from fleet_state import STATE_DTYPE, TELEMETRY_KEYS, select_fields
+from fleet_telemetry import FleetTelemetry
+
+
+# magic, version, flags, reserved, record count; records follow back to back
+HEADER = struct.Struct("<4sBBHI")
+MAGIC = b"CTLM"
+VERSION = 1
+FLAG_DELTA = 1  # Only robots that changed since the previous message
+
+# WebSocket subprotocol -> encoding, in server preference order
+SUBPROTOCOLS = {"carla.telemetry.msgpack": "msgpack", "carla.telemetry.struct": "struct"}
+KEYFRAME_INTERVAL = 5.0  # Seconds between full messages in delta mode
+
+
+def _load_msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def available_encodings():
+    return ["struct", "msgpack"] if _load_msgpack() is not None else ["struct"]
+
+
+def negotiate(offered, requested=None):
+    """(encoding, subprotocol) for a connection; raises ValueError if nothing offered is supported
+
+    A subprotocol offered by the client wins, otherwise the ?encoding= query
+    parameter, otherwise the fixed struct layout.
+    """
+    available = available_encodings()
+    for subprotocol, encoding in SUBPROTOCOLS.items():
+        if subprotocol in offered and encoding in available:
+            return encoding, subprotocol
+    if offered and not requested:
+        raise ValueError(f"No supported subprotocol in {offered}, choose from {list(SUBPROTOCOLS)}")
+    encoding = requested or "struct"
+    if encoding not in available:
+        raise ValueError(f"Unsupported encoding '{encoding}', choose from {available}")
+    return encoding, None
+
+
+class TelemetryChannel:
+    """Encodes fleet state rows for one WebSocket client
+
+    A JSON schema message (text) names the fields, their binary layout and the
+    robot id table, and is resent whenever the set of robots changes. Data
+    messages (binary) carry one record per robot referencing that table by
+    index. In delta mode only robots whose selected fields changed are sent,
+    with a full keyframe every KEYFRAME_INTERVAL seconds.
+    """
+
+    def __init__(self, encoding="struct", fields=None, delta=False, keyframe_interval=KEYFRAME_INTERVAL):
+        self.encoding = encoding
+        self.columns = select_fields(fields)
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+        self.record_dtype = np.dtype([("robot", "<u2")] + [
+            (name, STATE_DTYPE[name].newbyteorder("<")) for name in self.columns])
+        self._msgpack = _load_msgpack() if encoding == "msgpack" else None
+        self._robot_ids = None
+        self._last = None  # Records of the previous data message, in robot table order
+        self._last_keyframe = 0.0
+        self.stats = {"messages": 0, "keyframes": 0, "bytes": 0, "skipped": 0}
+
+    def schema(self):
+        return {
+            "type": "schema",
+            "version": VERSION,
+            "encoding": self.encoding,
+            "delta": self.delta,
+            "robot_ids": list(self._robot_ids),
+            "fields": [TELEMETRY_KEYS.get(name, name) for name in self.columns],
+            "header": HEADER.format,
+            "record": [[name if name == "robot" else TELEMETRY_KEYS.get(name, name), self.record_dtype[name].str]
+                       for name in self.record_dtype.names],
+            "record_size": self.record_dtype.itemsize,
+        }
+
+    def encode(self, robot_ids, rows):
+        """Messages to send for the current state: str for schema updates, bytes for data"""
+        messages = []
+        if robot_ids != self._robot_ids:
+            self._robot_ids = list(robot_ids)
+            self._last = None  # New table, so the next data message is a keyframe
+            messages.append(json.dumps(self.schema()))
+
+        records = np.empty(len(robot_ids), dtype=self.record_dtype)
+        records["robot"] = np.arange(len(robot_ids))
+        for name in self.columns:
+            records[name] = rows[name]
+
+        now = time.monotonic()
+        keyframe = not self.delta or self._last is None or now - self._last_keyframe >= self.keyframe_interval
+        if keyframe:
+            send, flags = records, 0
+            self._last_keyframe = now
+            self.stats["keyframes"] += 1
+        else:
+            changed = np.zeros(len(records), dtype=bool)
+            for name in self.columns:
+                changed |= records[name] != self._last[name]
+            if not changed.any():
+                self.stats["skipped"] += 1
+                return messages
+            send, flags = records[changed], FLAG_DELTA
+        self._last = records
+
+        data = self._pack(send, flags)
+        self.stats["messages"] += 1
+        self.stats["bytes"] += len(data)
+        messages.append(data)
+        return messages
+
+    def _pack(self, records, flags):
+        if self.encoding == "msgpack":
+            return self._msgpack.packb({
+                "delta": bool(flags & FLAG_DELTA),
+                "robot": records["robot"].tolist(),
+                "columns": {TELEMETRY_KEYS.get(name, name): records[name].tolist() for name in self.columns},
+            })
+        return HEADER.pack(MAGIC, VERSION, flags, 0, len(records)) + records.tobytes()
+
+
+async def serve_telemetry(websocket, robot_ids=None, fields=None, encoding=None, rate=20.0, delta=False):
+    """Negotiate the encoding, then stream fleet telemetry over a WebSocket until the client leaves"""
+    offered = websocket.scope.get("subprotocols", [])
+    try:
+        encoding, subprotocol = negotiate(offered, encoding)
+        channel = TelemetryChannel(encoding, fields, delta)
+    except ValueError as e:
+        await websocket.accept()
+        await websocket.close(code=1008, reason=str(e)[:120])
+        return
+    await websocket.accept(subprotocol=subprotocol)
+
+    loop = asyncio.get_running_loop()
+    period = 1.0 / rate
+    next_send = loop.time()
+    while True:
+        ids, rows = FleetTelemetry.fleet_rows(robot_ids)
+        try:
+            for message in channel.encode(ids, rows):
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            return
+
+        next_send = max(next_send + period, loop.time())
+        # Waiting on receive paces the stream and notices disconnects even while delta mode sends nothing
+        while (remaining := next_send - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if message["type"] == "websocket.disconnect":
+                return
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The suite runs against the in-process stand-in simulator; nothing needs a CARLA server
+os.environ.setdefault("CARLA_BACKEND", "fake")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
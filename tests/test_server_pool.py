@@ -0,0 +1,83 @@
+import pytest
+from fastapi.testclient import TestClient
+import fake_carla
+from carla_connection import carla
+from carla_vehicle import CarlaController
+from server_pool import ServerPool, ServersDraining
+
+
+@pytest.fixture
+def pool(request):
+    """Pool over two stand-in servers, unique to the test so their worlds start empty"""
+    servers = [f"{request.node.name}-a:1", f"{request.node.name}-b:2"]
+    ServerPool._instance = ServerPool(servers, metric="actors")
+    yield ServerPool._instance
+    CarlaController.destroy_fleet()
+    ServerPool._instance = None
+
+
+def add_traffic(endpoint, count):
+    """Vehicles that are not ours, making a server look busy"""
+    host, _, port = endpoint.rpartition(":")
+    world = fake_carla.get_world(host, int(port))
+    blueprint = world.get_blueprint_library().find("vehicle.tesla.model3")
+    for i in range(count):
+        world.spawn_actor(blueprint, carla.Transform(carla.Location(x=1000.0 + 10 * i, y=-1000.0)))
+
+
+def test_places_on_least_loaded_server(pool):
+    busy, idle = pool.servers
+    add_traffic(busy, 3)
+    first = CarlaController.get_instance("r1")
+    assert first.server == idle
+
+    # Robots placed since the last measurement count, so a burst spreads out instead of piling up
+    ids = [f"r{i}" for i in range(2, 8)]
+    CarlaController.spawn_fleet(ids)
+    placement = pool.placements()
+    assert sorted(placement) == sorted(["r1"] + ids)
+    robots = {endpoint: sum(1 for e in placement.values() if e == endpoint) for endpoint in pool.servers}
+    assert robots[idle] - robots[busy] in (2, 3)
+
+
+def test_drained_server_gets_no_new_robots(pool):
+    drained, other = pool.servers
+    CarlaController.get_instance("before")
+    pool.drain(drained)
+    for i in range(4):
+        assert CarlaController.get_instance(f"after{i}").server == other
+    assert pool.get_stats()[drained]["draining"] is True
+
+    pool.drain(drained, draining=False)
+    CarlaController.spawn_fleet([f"again{i}" for i in range(4)])
+    assert drained in pool.placements().values()
+
+
+def test_all_draining_rejects_new_robots(pool):
+    for endpoint in pool.servers:
+        pool.drain(endpoint)
+    with pytest.raises(ServersDraining):
+        CarlaController.get_instance("nowhere")
+    assert CarlaController.lookup("nowhere") is None
+
+
+def test_all_draining_is_503(pool):
+    import main
+    for endpoint in pool.servers:
+        pool.drain(endpoint)
+    with TestClient(main.app) as client:
+        response = client.post("/robots/nowhere/spawn", params={"x": 0, "y": 0, "z": 0})
+        assert response.status_code == 503
+        assert "draining" in response.json()["detail"]
+
+
+def test_destroy_releases_placement(pool):
+    CarlaController.spawn_fleet(["d1", "d2", "d3"])
+    endpoint = pool.placement("d1")
+    assert endpoint in pool.servers
+
+    CarlaController.destroy_instance("d1")
+    assert pool.placement("d1") is None
+    CarlaController.destroy_fleet(["d2", "d3"])
+    assert pool.placements() == {}
+    assert all(stats["robots"] == 0 for stats in pool.get_stats().values())
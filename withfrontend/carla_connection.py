@@ -0,0 +1,113 @@
+import os
+import threading
+
+
+# "fake" runs against the in-process stand-in simulator (fake_carla.py) instead of a CARLA server
+CARLA_BACKEND = os.environ.get("CARLA_BACKEND", "carla")
+if CARLA_BACKEND == "fake":
+    import fake_carla as carla
+else:
+    import carla
+
+CARLA_HOST = os.environ.get("CARLA_HOST", "localhost")
+CARLA_PORT = int(os.environ.get("CARLA_PORT", "2000"))
+
+
+class CarlaConnection:
+    """One shared client, world, map and blueprint library per CARLA server"""
+    _instances = {}  # Dictionary to store connections by (host, port)
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, host=CARLA_HOST, port=CARLA_PORT, timeout=5.0):
+        """Get or create the shared connection for a server, connecting if needed"""
+        key = (host, port)
+        with cls._instances_lock:
+            connection = cls._instances.get(key)
+            if connection is None:
+                connection = cls(host, port, timeout)
+                cls._instances[key] = connection
+        connection.connect()
+        return connection
+
+    @classmethod
+    def all_instances(cls):
+        with cls._instances_lock:
+            return list(cls._instances.values())
+
+    def __init__(self, host, port, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connected = False
+        self.client = None
+        self.world = None
+        self.map = None
+        self.bp_lib = None
+        self._lock = threading.RLock()
+
+    @property
+    def endpoint(self):
+        return f"{self.host}:{self.port}"
+
+    def connect(self):
+        """Open the client and fetch world, map and blueprints once; no-op when connected"""
+        with self._lock:
+            if self.connected:
+                return True
+            try:
+                client = carla.Client(self.host, self.port)
+                client.set_timeout(self.timeout)
+                world = client.get_world()
+                self.client = client
+                self._load_world(world)
+                self.connected = True
+                print(f"🔌 Connected to CARLA at {self.endpoint}")
+            except Exception as e:
+                print(f"❌ Failed to connect to CARLA at {self.endpoint}: {e}")
+                self.connected = False
+            return self.connected
+
+    def _load_world(self, world):
+        self.world = world
+        self.map = world.get_map()
+        self.bp_lib = world.get_blueprint_library()
+
+    def reconnect(self):
+        """Drop the current client and connect again"""
+        with self._lock:
+            self.connected = False
+            return self.connect()
+
+    def refresh_world(self):
+        """Re-fetch world, map and blueprints, e.g. after the server loaded a new map"""
+        with self._lock:
+            if not self.connected:
+                return self.connect()
+            self._load_world(self.client.get_world())
+            return True
+
+    def call(self, operation, replay=False):
+        """Run an RPC; if the connection was lost, reconnect and run it again only when replay is set
+
+        CARLA raises RuntimeError for timeouts and API errors as well, so the server is
+        probed first and only a confirmed disconnect reconnects. Writes keep replay=False:
+        they fail with the original error instead of possibly running twice.
+        """
+        try:
+            return operation()
+        except RuntimeError as e:
+            if self.alive():
+                raise
+            print(f"⚠️ Lost connection to CARLA at {self.endpoint} ({e}), reconnecting")
+            if not self.reconnect() or not replay:
+                raise
+            return operation()
+
+    def alive(self):
+        """True when the server still answers on the current client"""
+        try:
+            self.client.get_server_version()
+            return True
+        except Exception:
+            return False
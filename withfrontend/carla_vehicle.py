@@ -1,100 +1,233 @@
-import random
-import carla
+import asyncio
+import os
 import threading
 import time
-import math
-import cv2
-import numpy as np
-from queue import Queue
+from server_pool import ServerPool
+from fleet_telemetry import FleetTelemetry
+from frame_broadcaster import FrameBroadcaster
+from frame_encoder import FrameEncoderPool
+from camera_profiles import get_camera_profile
+from frame_ring import FrameRingBuffer
+from shm_export import SharedFrameExporter, segment_name
+from detection import DetectionService
+from route_planner import RoutePlanner
+from fleet_control import FleetController
+from world_stepper import WorldStepper
+from fleet_spawner import FleetSpawner
+from controller_registry import ControllerRegistry
+from carla_connection import carla
+
+
+# Seconds without viewers before a streaming camera stops listening
+CAMERA_IDLE_TIMEOUT = float(os.environ.get("CARLA_CAMERA_IDLE_TIMEOUT", "10"))
 
 
 class CarlaController:
-    _instances = {}  # Dictionary to store controller instances by robot_id
+    registry = ControllerRegistry()  # Controller instances by robot_id, safe under concurrent requests
 
     @classmethod
     def get_instance(cls, robot_id):
         """Get or create CarlaController instance for specific robot"""
-        if robot_id not in cls._instances:
-            controller = cls(robot_id)
-            if controller.initialized:
-                cls._instances[robot_id] = controller
-            else:
-                raise RuntimeError("Failed to initialize CARLA connection. Is the simulator running?")
-        return cls._instances[robot_id]
+        return cls.registry.get_or_create(robot_id, cls._create)
+
+    @classmethod
+    def _create(cls, robot_id):
+        controller = cls(robot_id)
+        if not controller.initialized:
+            ServerPool.get_instance().release(robot_id)
+            raise RuntimeError("Failed to initialize CARLA connection. Is the simulator running?")
+        return controller
+
+    @classmethod
+    def lookup(cls, robot_id):
+        """Existing controller for a robot, or None; never creates one"""
+        return cls.registry.get(robot_id)
 
     @classmethod
     def destroy_instance(cls, robot_id):
         """Destroy the instance for specified robot"""
-        if robot_id in cls._instances:
-            cls._instances[robot_id].cleanup()
-            del cls._instances[robot_id]
+        controller = cls.registry.pop(robot_id)
+        if controller is not None:
+            controller.cleanup()
             return f"Controller for robot {robot_id} destroyed successfully"
         return f"No controller for robot {robot_id} exists"
 
+    @classmethod
+    def spawn_fleet(cls, robot_ids):
+        """Create controllers for new robots and spawn all their vehicles in one batch; returns {robot_id: message}"""
+        new_ids = [robot_id for robot_id in robot_ids if robot_id not in cls.registry]
+        controllers = []
+        try:
+            for robot_id in robot_ids:
+                controllers.append(cls.get_instance(robot_id))
+        except BaseException:
+            # Robots this call already created would otherwise stay placed without a vehicle
+            for controller in controllers:
+                if controller.robot_id in new_ids:
+                    cls.destroy_instance(controller.robot_id)
+            raise
+        if not controllers:
+            return {}
+        # One batched spawn per server the robots were placed on
+        groups = {}
+        for controller in controllers:
+            groups.setdefault(controller.connection.endpoint, []).append(controller)
+        results = {}
+        for group in groups.values():
+            results.update(group[0].spawner.spawn(group))
+        # Robots created here but left without a vehicle are not kept around
+        for robot_id in new_ids:
+            controller = cls.registry.get(robot_id)
+            if controller is not None and controller.vehicle is None:
+                cls.destroy_instance(robot_id)
+        return results
+
+    @classmethod
+    def destroy_fleet(cls, robot_ids=None):
+        """Tear down several robots (all when robot_ids is None) and forget their controllers"""
+        if robot_ids is None:
+            robot_ids = cls.registry.ids()
+        # Unregister first so no request picks up a controller that is being torn down
+        controllers = [c for c in (cls.registry.pop(robot_id) for robot_id in robot_ids) if c is not None]
+        print(f"🚗 Tearing down {len(controllers)} robots")
+        destroyed = cls.teardown(controllers)
+        return f"{len(controllers)} robots destroyed ({destroyed} actors removed)"
+
+    @classmethod
+    def teardown(cls, controllers, timeout=2.0):
+        """Stop every activity of many robots, then destroy all their actors with one DestroyActor batch per server"""
+        for controller in controllers:
+            controller.stop_drive()
+            controller.stop_telemetry()
+            controller.stop_detection()
+            controller.stepper.unregister(controller.robot_id)
+            controller._stop_sensors()
+
+        # Wait for camera callbacks already in flight instead of sleeping
+        deadline = time.monotonic() + timeout
+        for controller in controllers:
+            if not controller._wait_for_callbacks(deadline - time.monotonic()):
+                print(f"⚠️ Camera callbacks of robot {controller.robot_id} still running after {timeout}s")
+
+        # Sensors go before the vehicles they are attached to
+        batches = {}
+        for controller in controllers:
+            connection, sensors, vehicles = batches.setdefault(controller.connection.endpoint, (controller.connection, [], []))
+            if controller.camera:
+                sensors.append(carla.command.DestroyActor(controller.camera.id))
+            if controller.vehicle:
+                vehicles.append(carla.command.DestroyActor(controller.vehicle.id))
+        destroyed = 0
+        for connection, sensors, vehicles in batches.values():
+            if not sensors and not vehicles:
+                continue
+            try:
+                responses = connection.client.apply_batch_sync(sensors + vehicles, False)
+                errors = [r.error for r in responses if r.has_error()]
+                destroyed += len(responses) - len(errors)
+                if errors:
+                    print(f"⚠️ {len(errors)} actors could not be destroyed: {errors[0]}")
+            except Exception as e:
+                print(f"❌ Error destroying actors: {e}")
+
+        for controller in controllers:
+            if controller.camera:
+                controller._release_camera()
+            if controller.vehicle:
+                controller.vehicle = None
+                controller.spawner.release(controller.robot_id)
+            controller.encoder.forget(controller.robot_id)
+            ServerPool.get_instance().release(controller.robot_id)
+        return destroyed
+
+    @classmethod
+    def servers(cls):
+        """Placement state of every configured CARLA server"""
+        return ServerPool.get_instance().get_stats()
+
+    @classmethod
+    def drain(cls, endpoint, draining=True):
+        """Stop (or resume) placing new robots on a server"""
+        return ServerPool.get_instance().drain(endpoint, draining)
+
     def __init__(self, robot_id):
         self.robot_id = robot_id
         self.initialized = False
         self.vehicle = None
         self.camera = None
-        self.current_frame = None
+        self.camera_profile = None
+        self.frame_broadcaster = FrameBroadcaster()
+        self.encoder = FrameEncoderPool.get_instance()
+        self.streaming = False
         self.camera_lock = threading.Lock()
-        self.telemetry_data = {}
-        self.telemetry_lock = threading.Lock()
-        self.frame_queue = Queue(maxsize=20)
+        self.spawn_lock = threading.RLock()  # Held while a vehicle is spawned for this robot, by any request
+        self.camera_paused = False
+        self.camera_idle_timeout = CAMERA_IDLE_TIMEOUT  # None keeps the sensor listening
+        self._idle_timer = None
+        self._callbacks_active = 0  # Camera callbacks currently running
+        self._callbacks_done = threading.Condition()
+        self._callbacks_closed = False  # Set once the camera is being torn down; late callbacks return at once
+        self.frame_broadcaster.on_subscribers_changed = self._on_viewers_changed
+        self.last_control = carla.VehicleControl()
+        self.frame_ring = None  # Raw BGR frames for detection and other in-process consumers
+        self.frame_exporter = None  # Shared memory export for out-of-process consumers
         self.telemetry_running = False
         self.detection_running = False
         self.navigation_running = False
-
-        try:
-            self.client = carla.Client('localhost', 2000)
-            self.client.set_timeout(10.0)  # Reduced timeout
-            # Check connection before proceeding
-            try:
-                self.world = self.client.get_world()
-                self.map = self.world.get_map()
-                self.bp_lib = self.world.get_blueprint_library()
-                self.initialized = True
-                print(f"🚗 Initialized CarlaController for robot {robot_id}")
-            except Exception as e:
-                print(f"❌ Failed to connect to CARLA: {e}")
-                # Set these to None so we can identify the failed state
-                self.world = None
-                self.map = None
-                self.bp_lib = None
-        except Exception as e:
-            print(f"❌ Failed to initialize CARLA client: {e}")
+        self.route = None  # [(x, y, z), ...] planned by start_drive
+
+        # Client, world, map and blueprints are shared by every controller on the same server,
+        # which is the least-loaded one of the pool when the robot is created
+        self.connection = ServerPool.get_instance().place(robot_id, timeout=10.0)
+        self.initialized = self.connection.connected
+        # Waits for this robot's camera each frame while the world runs in synchronous mode
+        self.stepper = WorldStepper.get_instance(self.connection)
+        self.spawner = FleetSpawner.get_instance(self.connection)
+        self.fleet_telemetry = FleetTelemetry.get_instance(self.connection)
+        if self.initialized:
+            self.stepper.register(self)
+            print(f"🚗 Initialized CarlaController for robot {robot_id}")
+
+    @property
+    def server(self):
+        """Endpoint of the CARLA server this robot was placed on"""
+        return self.connection.endpoint
+
+    @property
+    def client(self):
+        return self.connection.client
+
+    @property
+    def world(self):
+        return self.connection.world
+
+    @property
+    def map(self):
+        return self.connection.map
+
+    @property
+    def bp_lib(self):
+        return self.connection.bp_lib
 
     def cleanup(self):
         """Clean up all resources"""
         print(f"🚗 Cleaning up CarlaController for robot {self.robot_id}")
-        self.stop_drive()
-        self.stop_telemetry()
-        self.stop_detection()
-
-        # Detach camera before destroying vehicle
-        self.detach_camera()
-
-        # Add delay to ensure camera is fully detached
-        time.sleep(0.2)
-
-        if self.vehicle:
-            try:
-                self.vehicle.destroy()
-            except Exception as e:
-                print(f"❌ Error destroying vehicle: {e}")
-            self.vehicle = None
+        self.teardown([self])
 
     def spawn_vehicle(self, x=None, y=None, z=None):
+        with self.spawn_lock:
+            return self._spawn_vehicle(x, y, z)
+
+    def _spawn_vehicle(self, x, y, z):
         if self.vehicle:
             return "Vehicle already spawned."
 
-        # Get list of available blueprints. Adjust filter if necessary.
-        blueprints = self.bp_lib.filter("vehicle.tesla.model3")
-        if not blueprints:
+        # Blueprint and spawn points are cached per map by the shared spawner
+        blueprint = self.spawner.blueprint()
+        if blueprint is None:
             return "No matching blueprint found."
-        blueprint = blueprints[0]
 
-        spawn_points = self.map.get_spawn_points()
+        spawn_points = self.spawner.spawn_points()
         print(f"Available spawn points: {len(spawn_points)}")
         if not spawn_points:
             return "No spawn points available on the map."
@@ -102,17 +235,19 @@ class CarlaController:
         # If coordinates provided, try to use that transform first
         if x is not None and y is not None and z is not None:
             transform = carla.Transform(carla.Location(x=x, y=y, z=z))
-            self.vehicle = self.world.try_spawn_actor(blueprint, transform)
-            if self.vehicle:
-                return f"Vehicle spawned at {transform.location}"
-
-        # Otherwise, try each available spawn point until one succeeds
-        for transform in random.sample(spawn_points, len(spawn_points)):
-            self.vehicle = self.world.try_spawn_actor(blueprint, transform)
+            try:
+                # Not retried: the server may have spawned the vehicle before the call failed
+                self.vehicle = self.world.try_spawn_actor(blueprint, transform)
+            except RuntimeError as e:
+                print(f"❌ Failed to spawn vehicle: {e}")
+                self.spawner.reconcile(blueprint, [transform])
+                return f"❌ Failed to spawn vehicle: {e}"
             if self.vehicle:
+                self.spawner.occupy(self.robot_id, self.vehicle, transform.location)
                 return f"Vehicle spawned at {transform.location}"
 
-        return "Failed to spawn vehicle from all available spawn points."
+        # Otherwise, take a free spawn point from the occupancy index
+        return self.spawner.spawn([self])[self.robot_id]
 
     def destroy_vehicle(self):
         self.stop_drive()
@@ -122,6 +257,7 @@ class CarlaController:
         if self.vehicle:
             self.vehicle.destroy()
             self.vehicle = None
+            self.spawner.release(self.robot_id)
             return "Vehicle destroyed."
         return "No vehicle to destroy."
 
@@ -129,134 +265,86 @@ class CarlaController:
         if not self.vehicle:
             return "No vehicle spawned."
 
-        def drive_loop():
-            self.navigation_running = True
-            dest = carla.Location(x=x, y=y, z=z)
-
-            while self.navigation_running:
-                # Get current location and distance to target
-                current = self.vehicle.get_location()
-                distance = current.distance(dest)
-
-                if distance < 2.0:
-                    # Arrived at destination
-                    control = carla.VehicleControl(throttle=0.0, brake=1.0)
-                    self.vehicle.apply_control(control)
-                    break
-
-                # Get next waypoint toward destination
-                next_wp = self.map.get_waypoint(current)
-                target_wp = self.map.get_waypoint(dest)
-
-                # Apply vehicle control
-                control = carla.VehicleControl()
-
-                # Simple speed control based on distance
-                desired_speed = min(30.0, distance * 3.0)
-                current_speed = self.vehicle.get_velocity().length() * 3.6  # km/h
-
-                if current_speed < desired_speed:
-                    control.throttle = 0.7
-                    control.brake = 0.0
-                else:
-                    control.throttle = 0.0
-                    control.brake = 0.5
-
-                # Apply steering based on waypoint direction
-                self.vehicle.apply_control(control)
-                time.sleep(0.1)
-
-            self.navigation_running = False
+        # Plan the whole route once; the loop then only reads cached telemetry
+        dest = carla.Location(x=x, y=y, z=z)
+        try:
+            route = RoutePlanner.for_map(self.map).plan(self.vehicle.get_location(), dest)
+        except Exception as e:
+            print(f"❌ Route planning failed: {e}")
+            return f"❌ Route planning failed: {e}"
+        if not route:
+            return "❌ No route found to destination."
 
-        threading.Thread(target=drive_loop, daemon=True).start()
-        return f"Driving to {x},{y},{z}"
+        # The fleet controller steers every driving robot from one fixed-rate loop
+        self.start_telemetry()
+        self.route = route
+        FleetController.get_instance(self.connection).add(self, route)
+        return f"Driving to {x},{y},{z} along {len(route)} route points"
 
     def stop_drive(self):
+        FleetController.get_instance(self.connection).remove(self.robot_id)
         self.navigation_running = False
         return "Drive stopped."
 
+    def submit_control(self, throttle=0.0, steer=0.0, brake=0.0, hand_brake=False, reverse=False, ack=None):
+        """Queue a direct control for the fleet loop's next batch; the newest command per step wins"""
+        if not self.vehicle:
+            return "No vehicle spawned."
+        control = carla.VehicleControl(
+            throttle=min(max(float(throttle), 0.0), 1.0),
+            steer=min(max(float(steer), -1.0), 1.0),
+            brake=min(max(float(brake), 0.0), 1.0),
+            hand_brake=bool(hand_brake),
+            reverse=bool(reverse))
+        FleetController.get_instance(self.connection).submit(self, control, ack)
+        return "Control queued."
+
+    def apply_control(self, control):
+        """Apply a control and remember it so telemetry can report it without an RPC"""
+        self.last_control = control
+        self.vehicle.apply_control(control)
+
     def start_telemetry(self):
         if not self.vehicle or self.telemetry_running:
             return "Telemetry already running or no vehicle."
 
-        def telemetry_loop():
-            self.telemetry_running = True
-            while self.telemetry_running:
-                t = self.vehicle.get_transform()
-                v = self.vehicle.get_velocity()
-                c = self.vehicle.get_control()  # Get control data
-                speed = math.sqrt(v.x ** 2 + v.y ** 2 + v.z ** 2)
-                with self.telemetry_lock:
-                    self.telemetry_data = {
-                        "x": t.location.x,
-                        "y": t.location.y,
-                        "z": t.location.z,
-                        "yaw": t.rotation.yaw,
-                        "speed": speed * 3.6,
-                        "vehicle_id": self.vehicle.id,
-                        "vehicle_type": self.vehicle.type_id,
-                        "throttle": c.throttle,  # 0-1 value
-                        "steering": c.steer,  # -1 to 1 value
-                        "brake": c.brake,  # 0-1 value
-                    }
-                time.sleep(0.2)
-
-        threading.Thread(target=telemetry_loop, daemon=True).start()
+        # One fleet-wide collector reads a world snapshot per tick for all robots
+        self.fleet_telemetry.register(self)
+        self.telemetry_running = True
         return "Telemetry started."
 
     def stop_telemetry(self):
+        if self.telemetry_running:
+            self.fleet_telemetry.unregister(self.robot_id)
         self.telemetry_running = False
         return "Telemetry stopped."
 
-    def get_telemetry(self):
-        with self.telemetry_lock:
-            return self.telemetry_data.copy()
+    @property
+    def telemetry_data(self):
+        """Latest telemetry as a fresh dict built from this robot's row in the fleet state store; {} before the first tick"""
+        data = self.fleet_telemetry.state.row_dict(self.robot_id)
+        vehicle = self.vehicle
+        if data is None or vehicle is None:
+            return {}
+        data["vehicle_id"] = vehicle.id
+        data["vehicle_type"] = vehicle.type_id
+        return data
 
-    def start_streaming(self):
-        if not self.camera:
-            return "❌ No camera attached."
-
-        def _on_image(image):
-            try:
-                # Only process if we're still streaming
-                if self.camera and hasattr(image, 'raw_data'):
-                    array = np.frombuffer(image.raw_data, dtype=np.uint8).reshape((image.height, image.width, 4))[:, :,
-                            :3]
-                    _, buffer = cv2.imencode('.jpg', array)
-                    with self.camera_lock:
-                        self.current_frame = buffer.tobytes()
-                    if not self.frame_queue.full():
-                        self.frame_queue.put(array)
-            except Exception as e:
-                print(f"❌ Frame processing error: {e}")
-
-        try:
-            self.camera.listen(_on_image)
-            return "✅ Camera streaming started."
-        except Exception as e:
-            print(f"❌ Failed to start camera: {e}")
-            return f"❌ Camera streaming failed: {e}"
+    def get_telemetry(self):
+        return self.telemetry_data
 
     def start_streaming(self):
         if not self.camera:
             return "❌ No camera attached."
 
-        def _on_image(image):
-            try:
-                # Only process if we're still streaming
-                if self.camera and hasattr(image, 'raw_data'):
-                    array = np.frombuffer(image.raw_data, dtype=np.uint8).reshape((image.height, image.width, 4))[:, :,
-                            :3]
-                    _, buffer = cv2.imencode('.jpg', array)
-                    with self.camera_lock:
-                        self.current_frame = buffer.tobytes()
-                    if not self.frame_queue.full():
-                        self.frame_queue.put(array)
-            except Exception as e:
-                print(f"❌ Frame processing error: {e}")
-
         try:
-            self.camera.listen(_on_image)
+            with self.camera_lock:
+                self.camera.listen(self._on_image)
+                self.streaming = True
+                self.camera_paused = False
+                self.stepper.sensor_started(self.robot_id)
+            if not self._has_frame_demand():
+                self._schedule_idle_pause()
             return "✅ Camera streaming started."
         except Exception as e:
             print(f"❌ Failed to start camera: {e}")
@@ -265,90 +353,257 @@ class CarlaController:
     def stop_streaming(self):
         if self.camera:
             try:
-                self.camera.stop()
                 with self.camera_lock:
-                    self.current_frame = None
-                self.frame_queue.queue.clear()
+                    self._cancel_idle_timer()
+                    self.camera.stop()
+                    self.streaming = False
+                    self.camera_paused = False
+                self.encoder.discard(self.robot_id)
+                self.frame_broadcaster.clear()
                 return "✅ Camera streaming stopped."
             except RuntimeError as e:
                 print(f"⚠️ Error while stopping camera stream: {e}")
                 return "⚠️ Camera stop failed."
         return "No camera to stop streaming."
 
-    def get_current_frame(self):
+    def _on_image(self, image):
+        with self._callbacks_done:
+            # A callback the sensor thread dispatched before stop() may start after the drain counted zero
+            if self._callbacks_closed:
+                return
+            self._callbacks_active += 1
+        try:
+            # Only process if we're still streaming
+            if self.camera and hasattr(image, 'raw_data'):
+                # Encode only while someone is watching; the encoder pool does the work
+                if self.frame_broadcaster.subscriber_count > 0:
+                    self.encoder.submit(self.robot_id, image, self._publish_frame, self.camera_profile.quality)
+                self._store_raw_frame(image)
+                self.stepper.sensor_delivered(self.robot_id, image.frame, image.timestamp)
+        except Exception as e:
+            print(f"❌ Frame processing error: {e}")
+        finally:
+            with self._callbacks_done:
+                self._callbacks_active -= 1
+                self._callbacks_done.notify_all()
+
+    def _wait_for_callbacks(self, timeout=1.0):
+        """Block until camera callbacks already running have returned; False on timeout"""
+        with self._callbacks_done:
+            return self._callbacks_done.wait_for(lambda: self._callbacks_active == 0, max(0.0, timeout))
+
+    def _store_raw_frame(self, image):
+        # Raw frames are copied into the ring once, and only while a consumer needs them
+        ring = self.frame_ring
+        if ring is not None and self.detection_running:
+            ring.write_bgra(image.raw_data, image.frame, image.timestamp)
+            DetectionService.get_instance().frame_ready()
+        exporter = self.frame_exporter
+        if exporter is not None:
+            exporter.write_bgra(image.raw_data, image.frame, image.timestamp)
+
+    def _needs_raw_frames(self):
+        return self.detection_running or self.frame_exporter is not None
+
+    def _has_frame_demand(self):
+        return self.frame_broadcaster.subscriber_count > 0 or self._needs_raw_frames()
+
+    def _on_viewers_changed(self, count):
+        # Called on the event loop; listen() and stop() are simulator round trips, so they run off it
+        asyncio.get_running_loop().run_in_executor(None, self._frame_demand_changed)
+
+    def _frame_demand_changed(self):
+        if self._has_frame_demand():
+            self._resume_camera()
+        else:
+            self._schedule_idle_pause()
+
+    def _schedule_idle_pause(self):
+        if self.camera_idle_timeout is None:
+            return
+        with self.camera_lock:
+            self._cancel_idle_timer()
+            self._idle_timer = threading.Timer(self.camera_idle_timeout, self._pause_if_idle)
+            self._idle_timer.daemon = True
+            self._idle_timer.start()
+
+    def _cancel_idle_timer(self):
+        # Caller holds camera_lock
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _pause_if_idle(self):
+        with self.camera_lock:
+            self._idle_timer = None
+            if not self.streaming or self.camera_paused or self._has_frame_demand():
+                return
+            try:
+                self.camera.stop()
+                self.camera_paused = True
+                print(f"⏸️ Camera of robot {self.robot_id} paused, no viewers")
+            except Exception as e:
+                print(f"⚠️ Warning while pausing camera: {e}")
+
+    def _resume_camera(self):
         with self.camera_lock:
-            return self.current_frame
+            # Demand is rechecked under the lock: the viewer may have left before this ran,
+            # in which case the idle timer scheduled meanwhile must stay
+            if not self._has_frame_demand():
+                return
+            self._cancel_idle_timer()
+            if not self.streaming or not self.camera_paused:
+                return
+            try:
+                self.camera.listen(self._on_image)
+                self.camera_paused = False
+                self.stepper.sensor_started(self.robot_id)
+                print(f"▶️ Camera of robot {self.robot_id} resumed")
+            except Exception as e:
+                print(f"❌ Failed to resume camera: {e}")
+
+    def _publish_frame(self, jpeg):
+        # Drop frames that finish encoding after streaming was stopped
+        if self.streaming:
+            self.frame_broadcaster.publish(jpeg)
+
+    @property
+    def current_frame(self):
+        return self.frame_broadcaster.latest()[1]
 
-    def attach_camera(self):
+    def get_current_frame(self):
+        return self.current_frame
+
+    def attach_camera(self, profile="default", **overrides):
+        """Attach an RGB camera using a named profile (see camera_profiles.py) plus explicit overrides"""
         if not self.vehicle:
             return "No vehicle to attach camera."
 
+        try:
+            camera_profile = get_camera_profile(profile, **overrides)
+        except ValueError as e:
+            return f"❌ {e}"
+
         # Clean up existing camera
         self.detach_camera()
 
         try:
             # Setup camera blueprint
             cam_bp = self.bp_lib.find("sensor.camera.rgb")
-            cam_bp.set_attribute("image_size_x", "640")
-            cam_bp.set_attribute("image_size_y", "480")
-            cam_bp.set_attribute("fov", "90")
+            cam_bp.set_attribute("image_size_x", str(camera_profile.width))
+            cam_bp.set_attribute("image_size_y", str(camera_profile.height))
+            cam_bp.set_attribute("fov", str(camera_profile.fov))
+            cam_bp.set_attribute("sensor_tick", str(camera_profile.sensor_tick))
 
             # Position the camera
-            cam_transform = carla.Transform(carla.Location(x=1.5, z=2.4))
+            cam_transform = carla.Transform(
+                carla.Location(x=camera_profile.mount_x, y=camera_profile.mount_y, z=camera_profile.mount_z),
+                carla.Rotation(pitch=camera_profile.pitch))
 
             # Spawn camera
             self.camera = self.world.spawn_actor(cam_bp, cam_transform, attach_to=self.vehicle)
-            return "✅ Camera attached."
+            with self._callbacks_done:
+                self._callbacks_closed = False
+            self.camera_profile = camera_profile
+            self.frame_ring = FrameRingBuffer(camera_profile.width, camera_profile.height)
+            return f"✅ Camera attached ({camera_profile.name} {camera_profile.width}x{camera_profile.height})."
         except Exception as e:
             print(f"❌ Error attaching camera: {e}")
             return f"❌ Camera attachment failed: {e}"
 
+    def start_frame_export(self):
+        """Publish raw camera frames to shared memory; read them with shm_export.SharedFrameReader"""
+        if not self.camera:
+            return "❌ No camera attached."
+        if self.frame_exporter is not None:
+            return f"⚠️ Frame export already active ({self.frame_exporter.name})"
+        try:
+            self.frame_exporter = SharedFrameExporter(
+                segment_name(self.robot_id), self.camera_profile.width, self.camera_profile.height)
+        except Exception as e:
+            print(f"❌ Failed to start frame export: {e}")
+            return f"❌ Frame export failed: {e}"
+        if not self.streaming:
+            self.start_streaming()
+        # External readers count as demand, so a paused camera resumes
+        self._frame_demand_changed()
+        return f"✅ Exporting frames to shared memory segment {self.frame_exporter.name}"
+
+    def stop_frame_export(self):
+        exporter = self.frame_exporter
+        if exporter is None:
+            return "No frame export running."
+        self.frame_exporter = None
+        exporter.close()
+        self._frame_demand_changed()
+        return "✅ Frame export stopped."
+
     def detach_camera(self):
         if self.camera:
+            self._stop_sensors()
+            # The camera must outlive any callback still using it
+            self._wait_for_callbacks()
             try:
-                self.camera.stop()
-            except Exception as e:
-                print(f"⚠️ Warning while stopping camera: {e}")
-
-            try:
-                # Add small delay to ensure callback completes
-                time.sleep(0.1)
                 self.camera.destroy()
             except Exception as e:
                 print(f"❌ Error while destroying camera: {e}")
-
-            self.camera = None
-            with self.camera_lock:
-                self.current_frame = None
-            # Clear queue to prevent stale data
-            while not self.frame_queue.empty():
-                try:
-                    self.frame_queue.get_nowait()
-                except:
-                    pass
+            self._release_camera()
             return "Camera detached."
         return "No camera to detach."
 
-    # def start_detection(self):
-    #     if self.detection_running:
-    #         return "Detection already running."
-    #     def detect_loop():
-    #         self.detection_running = True
-    #         channel = grpc.insecure_channel("localhost:50051")
-    #         stub = detection_pb2_grpc.YOLODetectionStub(channel)
-    #         while self.detection_running:
-    #             if not self.frame_queue.empty():
-    #                 frame = self.frame_queue.get()
-    #                 _, buffer = cv2.imencode('.jpg', frame)
-    #                 request = detection_pb2.DetectionRequest(image=buffer.tobytes())
-    #                 response = stub.Detect(request)
-    #                 print("Detections:", [(d.label, d.confidence) for d in response.detections])
-    #             else:
-    #                 time.sleep(0.05)
-    #         channel.close()
-    #     threading.Thread(target=detect_loop, daemon=True).start()
-    #     return "Detection started."
+    def _stop_sensors(self):
+        """Stop the camera and everything it feeds, keeping the actor"""
+        if not self.camera:
+            return
+        self.stop_frame_export()
+        with self.camera_lock:
+            self._cancel_idle_timer()
+            self.streaming = False
+            self.camera_paused = False
+        with self._callbacks_done:
+            self._callbacks_closed = True
+        try:
+            self.camera.stop()
+        except Exception as e:
+            print(f"⚠️ Warning while stopping camera: {e}")
+
+    def _release_camera(self):
+        self.camera = None
+        # Per-robot encoder stats go with the camera, so /encoder/stats only lists live cameras
+        self.encoder.forget(self.robot_id)
+        self.frame_broadcaster.clear()
+        # Drop the raw ring so no stale frames are served
+        self.frame_ring = None
+
+    def start_detection(self):
+        """Feed this robot's camera into the shared, batched detection service"""
+        if self.detection_running:
+            return "Detection already running."
+        if not self.camera:
+            return "❌ No camera attached."
+        try:
+            service = DetectionService.get_instance()
+        except Exception as e:
+            print(f"❌ Failed to start detection service: {e}")
+            return f"❌ Detection failed: {e}"
+
+        self.detection_running = True
+        service.enable(self)
+        if not self.streaming:
+            self.start_streaming()
+        # Detection counts as demand, so a paused camera resumes
+        self._frame_demand_changed()
+        return "Detection started."
 
     def stop_detection(self):
-        self.detection_running = False
-        return "Detection stopped."
\ No newline at end of file
+        if self.detection_running:
+            DetectionService.get_instance().disable(self.robot_id)
+            self.detection_running = False
+            self._frame_demand_changed()
+        return "Detection stopped."
+
+    def get_detections(self):
+        """Latest detection result for this robot, or None"""
+        if not self.detection_running:
+            return None
+        return DetectionService.get_instance().get_result(self.robot_id)
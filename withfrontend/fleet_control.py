@@ -0,0 +1,298 @@
+import math
+import os
+import threading
+import time
+import numpy as np
+from fleet_telemetry import FleetTelemetry
+from carla_connection import carla
+
+
+FLEET_CONTROL_HZ = float(os.environ.get("CARLA_FLEET_CONTROL_HZ", "20"))
+
+WHEELBASE = 2.9  # Metres, Tesla Model 3
+MAX_STEER_ANGLE = math.radians(70.0)  # Wheel angle at steer=1.0
+MAX_SPEED = 30.0  # km/h
+ARRIVAL_DISTANCE = 2.0  # Metres from the last route point
+SEARCH_WINDOW = 50  # Route points searched ahead of the current progress
+
+
+class FleetController:
+    """Drives every routed robot on one server from a single fixed-rate loop
+
+    Each step reads one consistent slice of the fleet state store, computes pure-pursuit steering and PID
+    speed control for all driving robots in one NumPy pass, and sends every
+    VehicleControl in a single client.apply_batch(). Direct teleop commands
+    wait in a latest-wins mailbox per robot and go out in the same batch.
+    """
+    _instances = {}  # Dictionary to store fleet controllers by server endpoint
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, connection):
+        """Get or create the fleet controller for the server behind a connection"""
+        with cls._instances_lock:
+            if connection.endpoint not in cls._instances:
+                cls._instances[connection.endpoint] = cls(connection)
+            return cls._instances[connection.endpoint]
+
+    @classmethod
+    def all_instances(cls):
+        with cls._instances_lock:
+            return dict(cls._instances)
+
+    def __init__(self, connection, hz=FLEET_CONTROL_HZ, kp=0.25, ki=0.05, kd=0.02):
+        self.connection = connection
+        self.hz = hz
+        self.kp = kp  # PID gains on speed error in m/s
+        self.ki = ki
+        self.kd = kd
+        self._drives = {}  # robot_id -> drive state dict
+        self._commands = {}  # robot_id -> (controller, control, received, ack), newest teleop command only
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._arrays = None  # Concatenated routes, rebuilt when the set of drives changes
+        self._last_step = 0.0  # Monotonic time of the last loop step, so a restarted loop keeps the rate
+        self.external_clock = False  # True while a WorldStepper calls step() itself
+        self.stats = {"steps": 0, "overruns": 0, "missed_steps": 0, "robots": 0,
+                      "last_step_ms": 0.0, "avg_step_ms": 0.0, "max_step_ms": 0.0,
+                      "last_jitter_ms": 0.0, "avg_jitter_ms": 0.0, "max_jitter_ms": 0.0,
+                      "commands_applied": 0, "commands_superseded": 0, "commands_rejected": 0,
+                      "last_command_latency_ms": 0.0, "avg_command_latency_ms": 0.0}
+
+    def configure(self, hz=None, kp=None, ki=None, kd=None):
+        if hz is not None:
+            self.hz = max(1.0, float(hz))
+        for name, value in (("kp", kp), ("ki", ki), ("kd", kd)):
+            if value is not None:
+                setattr(self, name, float(value))
+        return {"hz": self.hz, "kp": self.kp, "ki": self.ki, "kd": self.kd}
+
+    def add(self, controller, route):
+        """Start following a route of (x, y, z) points; replaces any drive the robot already has"""
+        with self._lock:
+            self._drives[controller.robot_id] = {
+                "controller": controller,
+                "route": np.asarray(route, dtype=np.float64)[:, :2],
+                "progress": 0,
+                "integral": 0.0,
+                "previous_error": None,
+            }
+            self._arrays = None
+            controller.navigation_running = True
+            self._ensure_running()
+        self._wake.set()
+
+    def submit(self, controller, control, ack=None):
+        """Queue a direct VehicleControl for the next step; takes the robot over from any drive
+
+        Only the newest command per robot is applied each step. ack(status, latency_ms)
+        is called exactly once per command with "applied", "superseded" or "rejected",
+        the latency measured from submission to the batch that carried it.
+        """
+        received = time.monotonic()
+        with self._lock:
+            previous = self._commands.get(controller.robot_id)
+            self._commands[controller.robot_id] = (controller, control, received, ack)
+            drive = self._drives.pop(controller.robot_id, None)
+            if drive is not None:
+                self._arrays = None
+                controller.navigation_running = False
+            if previous is not None:
+                self.stats["commands_superseded"] += 1
+            self._ensure_running()
+        if previous is not None and previous[3] is not None:
+            previous[3]("superseded", (received - previous[2]) * 1000.0)
+        self._wake.set()
+
+    def set_external_clock(self, enabled):
+        """Pause the fixed-rate loop while something else calls step() every frame"""
+        with self._lock:
+            self.external_clock = enabled
+            self._ensure_running()
+        self._wake.set()
+
+    def _ensure_running(self):
+        # Caller holds the lock
+        if self._thread is None and (self._drives or self._commands) and not self.external_clock:
+            self._thread = threading.Thread(target=self._loop, name="fleet-control", daemon=True)
+            self._thread.start()
+
+    def remove(self, robot_id):
+        with self._lock:
+            drive = self._drives.pop(robot_id, None)
+            if drive is not None:
+                self._arrays = None
+                drive["controller"].navigation_running = False
+        return drive is not None
+
+    def is_driving(self, robot_id):
+        with self._lock:
+            return robot_id in self._drives
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, robots=len(self._drives), **self.configure())
+
+    def _loop(self):
+        # Teleop commands restart an idle loop; they still wait for the next slot instead of stepping at once
+        next_step = max(time.monotonic(), self._last_step + 1.0 / self.hz)
+        while True:
+            with self._lock:
+                if not (self._drives or self._commands) or self.external_clock:
+                    self._thread = None
+                    return
+            period = 1.0 / self.hz
+            delay = next_step - time.monotonic()
+            if delay > 0:
+                # Woken early by a new drive or a clock change, recheck and keep the fixed schedule
+                self._wake.wait(delay)
+                self._wake.clear()
+                continue
+            woke = self._last_step = time.monotonic()
+            jitter_ms = (woke - next_step) * 1000.0
+
+            try:
+                self.step(period)
+            except Exception as e:
+                print(f"❌ Fleet control step failed: {e}")
+
+            finished = time.monotonic()
+            step_ms = (finished - woke) * 1000.0
+            next_step += period
+            missed = 0
+            if finished > next_step:
+                # Overran the period: skip the slots we missed instead of bursting to catch up
+                missed = int((finished - next_step) / period) + 1
+                next_step += missed * period
+            self._record(step_ms, jitter_ms, missed)
+
+    def _record(self, step_ms, jitter_ms, missed):
+        with self._lock:
+            s = self.stats
+            s["steps"] += 1
+            n = s["steps"]
+            s["last_step_ms"] = step_ms
+            s["avg_step_ms"] += (step_ms - s["avg_step_ms"]) / n
+            s["max_step_ms"] = max(s["max_step_ms"], step_ms)
+            s["last_jitter_ms"] = jitter_ms
+            s["avg_jitter_ms"] += (jitter_ms - s["avg_jitter_ms"]) / n
+            s["max_jitter_ms"] = max(s["max_jitter_ms"], jitter_ms)
+            if missed:
+                s["overruns"] += 1
+                s["missed_steps"] += missed
+
+    def _route_arrays(self, drives):
+        # Caller holds the lock
+        if self._arrays is None:
+            lengths = np.array([len(d["route"]) for d in drives], dtype=np.int64)
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+            points = np.concatenate([d["route"] for d in drives])
+            self._arrays = (points, starts, lengths)
+        return self._arrays
+
+    def step(self, dt):
+        """Compute one control for every driving robot and send them with pending teleop commands"""
+        with self._lock:
+            drives = list(self._drives.values())
+            commands, self._commands = self._commands, {}
+            if not drives and not commands:
+                return
+            arrays = self._route_arrays(drives) if drives else None
+
+        batch, arrived = self._drive_controls(drives, arrays, dt) if drives else ([], [])
+        acks = []
+        for controller, control, received, ack in commands.values():
+            if controller.vehicle is None:
+                acks.append((ack, "rejected", received))
+                continue
+            controller.last_control = control
+            batch.append(carla.command.ApplyVehicleControl(controller.vehicle.id, control))
+            acks.append((ack, "applied", received))
+        failed = None
+        if batch:
+            try:
+                self.connection.client.apply_batch(batch)
+            except Exception as e:
+                failed = e
+                acks = [(ack, "rejected", received) for ack, _, received in acks]
+        sent = time.monotonic()
+
+        with self._lock:
+            for drive in arrived:
+                robot_id = drive["controller"].robot_id
+                # Only finish the drive we stepped, not one started meanwhile
+                if self._drives.get(robot_id) is drive:
+                    del self._drives[robot_id]
+                    self._arrays = None
+                    drive["controller"].navigation_running = False
+            s = self.stats
+            for _, status, received in acks:
+                s["commands_" + status] += 1
+                if status == "applied":
+                    s["last_command_latency_ms"] = (sent - received) * 1000.0
+                    s["avg_command_latency_ms"] += (s["last_command_latency_ms"] - s["avg_command_latency_ms"]) / s["commands_applied"]
+        for ack, status, received in acks:
+            if ack is not None:
+                ack(status, (sent - received) * 1000.0)
+        if failed is not None:
+            raise failed
+
+    def _drive_controls(self, drives, arrays, dt):
+        # (ApplyVehicleControl commands, drives that reached their destination) for one step
+        points, starts, lengths = arrays
+        _, rows = FleetTelemetry.get_instance(self.connection).state.read([d["controller"].robot_id for d in drives])
+        active = rows["valid"] & np.array([d["controller"].vehicle is not None for d in drives], dtype=bool)
+        if not active.any():
+            return [], []
+        index = np.nonzero(active)[0]
+        rows = rows[index]
+        position = np.stack([rows["x"], rows["y"]], axis=1)
+        yaw = np.radians(rows["yaw"].astype(np.float64))
+        speed = rows["speed"].astype(np.float64) / 3.6  # m/s
+        starts, lengths = starts[index], lengths[index]
+        progress = np.array([drives[i]["progress"] for i in index], dtype=np.int64)
+        window = np.arange(SEARCH_WINDOW)
+
+        # Advance each robot along its route to the closest point ahead of it
+        ahead = starts[:, None] + np.minimum(progress[:, None] + window, lengths[:, None] - 1)
+        d2 = np.sum((points[ahead] - position[:, None]) ** 2, axis=2)
+        progress = np.minimum(progress + np.argmin(d2, axis=1), lengths - 1)
+
+        # Pure pursuit towards the first point one lookahead distance further along
+        lookahead = np.maximum(4.0, speed * 0.8)
+        ahead = starts[:, None] + np.minimum(progress[:, None] + window, lengths[:, None] - 1)
+        distances = np.hypot(*(points[ahead] - position[:, None]).transpose(2, 0, 1))
+        beyond = distances >= lookahead[:, None]
+        end = points[starts + lengths - 1]
+        target = np.where(beyond.any(axis=1)[:, None], points[ahead[np.arange(len(index)), np.argmax(beyond, axis=1)]], end)
+        alpha = np.arctan2(target[:, 1] - position[:, 1], target[:, 0] - position[:, 0]) - yaw
+        alpha = np.arctan2(np.sin(alpha), np.cos(alpha))
+        steer = np.clip(np.arctan2(2.0 * WHEELBASE * np.sin(alpha), lookahead) / MAX_STEER_ANGLE, -1.0, 1.0)
+
+        # PID on speed, slowing down towards the destination
+        remaining = np.hypot(end[:, 0] - position[:, 0], end[:, 1] - position[:, 1])
+        desired = np.minimum(MAX_SPEED, remaining * 3.0) / 3.6
+        error = desired - speed
+        integral = np.clip(np.array([drives[i]["integral"] for i in index]) + error * dt, -10.0, 10.0)
+        previous = np.array([drives[i]["previous_error"] for i in index], dtype=np.float64)
+        previous = np.where(np.isnan(previous), error, previous)  # No derivative kick on the first step
+        effort = self.kp * error + self.ki * integral + self.kd * (error - previous) / dt
+        throttle = np.clip(effort, 0.0, 1.0)
+        brake = np.clip(-effort, 0.0, 1.0)
+        arrived = remaining < ARRIVAL_DISTANCE
+
+        batch = []
+        for k, i in enumerate(index):
+            drive = drives[i]
+            controller = drive["controller"]
+            if arrived[k]:
+                control = carla.VehicleControl(throttle=0.0, brake=1.0)
+            else:
+                control = carla.VehicleControl(throttle=float(throttle[k]), steer=float(steer[k]), brake=float(brake[k]))
+            drive["progress"] = int(progress[k])
+            drive["integral"] = float(integral[k])
+            drive["previous_error"] = float(error[k])
+            controller.last_control = control
+            batch.append(carla.command.ApplyVehicleControl(controller.vehicle.id, control))
+        return batch, [drives[i] for k, i in enumerate(index) if arrived[k]]
@@ -0,0 +1,179 @@
+import threading
+import time
+import numpy as np
+
+
+# One row per robot, updated in place every telemetry tick
+STATE_DTYPE = np.dtype([
+    ("x", np.float64),
+    ("y", np.float64),
+    ("z", np.float64),
+    ("yaw", np.float32),
+    ("speed", np.float32),  # km/h
+    ("throttle", np.float32),
+    ("steer", np.float32),
+    ("brake", np.float32),
+    ("frame", np.int64),
+    ("timestamp", np.float64),  # Simulation seconds
+    ("road_id", np.int32),
+    ("lane_id", np.int32),
+    ("lane_yaw", np.float32),
+    ("lane_offset", np.float32),
+    ("valid", np.bool_),  # False until the robot's first update
+])
+STATE_FIELDS = [name for name in STATE_DTYPE.names if name != "valid"]
+
+# Column -> key in the per-robot telemetry dicts served by the API
+TELEMETRY_KEYS = {"steer": "steering", "timestamp": "sim_time"}
+API_FIELDS = {TELEMETRY_KEYS.get(name, name): name for name in STATE_FIELDS}
+
+
+class FleetStateStore:
+    """Preallocated NumPy structured array holding the state of every robot on a server
+
+    A single writer (the telemetry collector) updates rows in place under a
+    seqlock-style version: odd while a write is in progress, even when done.
+    Readers copy the rows they need without locking and retry if the version
+    moved, so every snapshot is consistent across the whole fleet.
+    """
+
+    def __init__(self, capacity=64):
+        self.version = 0
+        self._rows = np.zeros(capacity, dtype=STATE_DTYPE)
+        self._ids = [None] * capacity  # Slot -> robot_id
+        self._slots = {}  # robot_id -> slot
+        self._free = list(range(capacity - 1, -1, -1))
+        self._write_lock = threading.Lock()
+
+    def _begin(self):
+        # Caller holds the write lock
+        self.version += 1
+
+    def _end(self):
+        self.version += 1
+
+    def allocate(self, robot_id):
+        """Row for a robot, creating it (and growing the array) if needed"""
+        with self._write_lock:
+            if robot_id in self._slots:
+                return self._slots[robot_id]
+            self._begin()
+            if not self._free:
+                capacity = len(self._rows)
+                self._rows = np.concatenate([self._rows, np.zeros(capacity, dtype=STATE_DTYPE)])
+                self._ids.extend([None] * capacity)
+                self._free = list(range(2 * capacity - 1, capacity - 1, -1))
+            slot = self._free.pop()
+            self._rows[slot] = np.zeros((), dtype=STATE_DTYPE)
+            self._ids[slot] = robot_id
+            self._slots[robot_id] = slot
+            self._end()
+            return slot
+
+    def release(self, robot_id):
+        with self._write_lock:
+            slot = self._slots.pop(robot_id, None)
+            if slot is None:
+                return
+            self._begin()
+            self._rows[slot]["valid"] = False
+            self._ids[slot] = None
+            self._free.append(slot)
+            self._end()
+
+    def slot(self, robot_id):
+        return self._slots.get(robot_id)
+
+    def write(self, robot_ids, **columns):
+        """Update columns of several robots' rows at once, e.g. write(robot_ids, x=xs, y=ys)
+
+        Robots are resolved to rows under the write lock, so a robot released
+        since its values were gathered is skipped instead of reviving a freed row.
+        """
+        with self._write_lock:
+            slots = np.array([self._slots.get(robot_id, -1) for robot_id in robot_ids], dtype=np.int64)
+            kept = slots >= 0
+            if not kept.all():
+                slots = slots[kept]
+                columns = {name: np.asarray(values)[kept] if np.ndim(values) else values
+                           for name, values in columns.items()}
+            if not len(slots):
+                return
+            self._begin()
+            rows = self._rows
+            for name, values in columns.items():
+                rows[name][slots] = values
+            rows["valid"][slots] = True
+            self._end()
+
+    def _consistent(self, read):
+        # Retry a read until no write overlapped it
+        while True:
+            before = self.version
+            if before % 2:
+                time.sleep(0)
+                continue
+            result = read()
+            if self.version == before:
+                return before, result
+
+    def read(self, robot_ids):
+        """(version, rows) for the given robots in order; unknown robots get a row with valid=False"""
+        def read():
+            slots = np.array([self._slots.get(robot_id, -1) for robot_id in robot_ids], dtype=np.int64)
+            rows = self._rows[np.maximum(slots, 0)] if len(slots) else np.zeros(0, dtype=STATE_DTYPE)
+            rows["valid"] &= slots >= 0
+            return rows
+        return self._consistent(read)
+
+    def snapshot(self):
+        """(version, robot_ids, rows) for every robot with state; rows is a copy"""
+        def read():
+            rows = self._rows
+            slots = np.nonzero(rows["valid"])[0]
+            return [self._ids[i] for i in slots], rows[slots]
+        version, (robot_ids, rows) = self._consistent(read)
+        return version, robot_ids, rows
+
+    def row_dict(self, robot_id):
+        """Telemetry dict for one robot, or None before its first update"""
+        _, rows = self.read([robot_id])
+        if not rows[0]["valid"]:
+            return None
+        return row_to_dict(rows[0])
+
+
+def row_to_dict(row, fields=STATE_FIELDS):
+    """Plain-Python telemetry dict from one state row, using the API's key names"""
+    return {TELEMETRY_KEYS.get(name, name): row[name].item() for name in fields}
+
+
+def select_fields(fields=None):
+    """Columns for a list of API field names (all when None); raises ValueError on unknown names"""
+    if not fields:
+        return STATE_FIELDS
+    unknown = [field for field in fields if field not in API_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown telemetry fields {unknown}, choose from {sorted(API_FIELDS)}")
+    return [API_FIELDS[field] for field in fields]
+
+
+def build_payload(robot_ids, rows, fields=None, columnar=False):
+    """One JSON-ready payload for many robots
+
+    Row form maps robot_id to a telemetry dict; columnar form sends each field
+    once as a list aligned with robot_ids, which is far smaller for big fleets.
+    """
+    columns = select_fields(fields)
+    if columnar:
+        return {
+            "count": len(robot_ids),
+            "robot_ids": list(robot_ids),
+            "columns": {TELEMETRY_KEYS.get(name, name): rows[name].tolist() for name in columns},
+        }
+    values = [rows[name].tolist() for name in columns]
+    keys = [TELEMETRY_KEYS.get(name, name) for name in columns]
+    return {
+        "count": len(robot_ids),
+        "robots": {robot_id: dict(zip(keys, row)) for robot_id, row in zip(robot_ids, zip(*values))},
+    }
@@ -0,0 +1,192 @@
+import threading
+import time
+import numpy as np
+from waypoint_index import WaypointIndex
+from fleet_state import FleetStateStore, STATE_DTYPE, build_payload
+
+
+class FleetTelemetry:
+    """Fills the state row of every registered robot from one world snapshot per tick"""
+    _instances = {}  # Dictionary to store collectors by server endpoint
+    _instances_lock = threading.Lock()
+    _sources = []  # Callables returning (robot_ids, rows) for robots hosted in other processes
+
+    @classmethod
+    def get_instance(cls, connection):
+        """Get or create the collector for the server behind a connection"""
+        with cls._instances_lock:
+            if connection.endpoint not in cls._instances:
+                cls._instances[connection.endpoint] = cls(connection)
+            return cls._instances[connection.endpoint]
+
+    @classmethod
+    def all_instances(cls):
+        with cls._instances_lock:
+            return dict(cls._instances)
+
+    @classmethod
+    def add_source(cls, source):
+        with cls._instances_lock:
+            cls._sources = cls._sources + [source]
+
+    @classmethod
+    def remove_source(cls, source):
+        with cls._instances_lock:
+            cls._sources = [s for s in cls._sources if s != source]
+
+    @classmethod
+    def fleet_snapshot(cls, robot_ids=None, fields=None, columnar=False):
+        """State of every robot with telemetry, across all servers, as one payload (see fleet_state.build_payload)"""
+        ids, rows = cls.fleet_rows(robot_ids)
+        return build_payload(ids, rows, fields, columnar)
+
+    @classmethod
+    def fleet_rows(cls, robot_ids=None):
+        """(robot_ids, rows) for every robot with telemetry across all servers, optionally filtered"""
+        ids, parts = [], []
+        for collector in cls.all_instances().values():
+            _, collector_ids, rows = collector.state.snapshot()
+            ids.extend(collector_ids)
+            parts.append(rows)
+        for source in cls._sources:
+            source_ids, rows = source()
+            ids.extend(source_ids)
+            parts.append(rows)
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=STATE_DTYPE)
+        if robot_ids is not None:
+            wanted = set(robot_ids)
+            keep = [i for i, robot_id in enumerate(ids) if robot_id in wanted]
+            ids = [ids[i] for i in keep]
+            rows = rows[keep]
+        return ids, rows
+
+    def __init__(self, connection, min_interval=0.05):
+        self.connection = connection
+        self.min_interval = min_interval  # Skip snapshots arriving faster than this (seconds)
+        self._controllers = {}
+        self._lock = threading.Lock()
+        self._world = None
+        self._callback_id = None
+        self._last_update = 0.0
+        self.last_frame = None
+        self.lanes = None  # WaypointIndex of the current map, for lane fields; None until it is loaded
+        self._lanes_map = None  # Map the lane index was loaded (or is loading) for
+        self.external_clock = False  # True while a WorldStepper calls ingest() itself
+        self.state = FleetStateStore()  # One row per registered robot, updated in place
+
+    def register(self, controller):
+        with self._lock:
+            self._controllers[controller.robot_id] = controller
+            self.state.allocate(controller.robot_id)
+            self._ensure_listening()
+            self._ensure_lane_index()
+
+    def set_external_clock(self, enabled):
+        """Stop listening to world ticks while something else feeds ingest() every frame"""
+        with self._lock:
+            self.external_clock = enabled
+            if enabled:
+                self._stop_listening()
+            elif self._controllers:
+                self._ensure_listening()
+
+    def _ensure_lane_index(self):
+        # Caller holds the lock. Building walks the whole map, so it runs on a background thread
+        # and ingest fills lane fields only once the index is ready
+        carla_map = self.connection.map
+        if self._lanes_map is carla_map:
+            return
+        self._lanes_map = carla_map
+        self.lanes = None
+        threading.Thread(target=self._load_lane_index, args=(carla_map,),
+                         name="lane-index", daemon=True).start()
+
+    def _load_lane_index(self, carla_map):
+        try:
+            lanes = WaypointIndex.for_map(carla_map)
+        except Exception as e:
+            print(f"⚠️ Lane index unavailable, telemetry will omit lane fields: {e}")
+            lanes = None
+        with self._lock:
+            if self._lanes_map is carla_map:
+                self.lanes = lanes
+
+    def unregister(self, robot_id):
+        with self._lock:
+            self._controllers.pop(robot_id, None)
+            self.state.release(robot_id)
+            if not self._controllers:
+                self._stop_listening()
+
+    def _ensure_listening(self):
+        if self.external_clock:
+            return
+        world = self.connection.world
+        if self._callback_id is not None and self._world is world:
+            return
+        # (Re)subscribe, e.g. after the connection was re-established on a new world
+        self._stop_listening()
+        self._world = world
+        self._callback_id = world.on_tick(self._on_tick)
+
+    def _stop_listening(self):
+        if self._callback_id is None:
+            return
+        try:
+            self._world.remove_on_tick(self._callback_id)
+        except Exception as e:
+            print(f"⚠️ Warning while removing telemetry tick callback: {e}")
+        self._callback_id = None
+        self._world = None
+
+    def _on_tick(self, snapshot):
+        now = time.monotonic()
+        if now - self._last_update < self.min_interval:
+            return
+        self._last_update = now
+        self.ingest(snapshot)
+
+    def ingest(self, snapshot):
+        """Update every registered robot from a single world snapshot"""
+        with self._lock:
+            controllers = list(self._controllers.values())
+        self.last_frame = snapshot.frame
+        sim_time = snapshot.timestamp.elapsed_seconds
+        found = []
+        for controller in controllers:
+            vehicle = controller.vehicle
+            if vehicle is None:
+                continue
+            actor = snapshot.find(vehicle.id)
+            if actor is None:
+                continue
+            found.append((controller.robot_id, controller.last_control, actor.get_transform(), actor.get_velocity()))
+        if not found:
+            return
+
+        # Columns for the whole fleet, written into the state store in one pass
+        position = np.array([[t.location.x, t.location.y, t.location.z] for _, _, t, _ in found])
+        velocity = np.array([[v.x, v.y, v.z] for _, _, _, v in found])
+        controls = np.array([[c.throttle, c.steer, c.brake] for _, c, _, _ in found])  # Last applied, no RPC
+        columns = {
+            "x": position[:, 0],
+            "y": position[:, 1],
+            "z": position[:, 2],
+            "yaw": [t.rotation.yaw for _, _, t, _ in found],
+            "speed": np.linalg.norm(velocity, axis=1) * 3.6,
+            "throttle": controls[:, 0],
+            "steer": controls[:, 1],
+            "brake": controls[:, 2],
+            "frame": snapshot.frame,
+            "timestamp": sim_time,
+        }
+
+        # Lane lookups for the whole fleet in one vectorized query against the local index
+        lanes = self.lanes
+        if lanes is not None:
+            lane = lanes.nearest_lane(position)
+            columns["road_id"] = lane["road_id"]
+            columns["lane_id"] = lane["lane_id"]
+            columns["lane_yaw"] = lane["yaw"]
+            columns["lane_offset"] = lane["distance"]  # Metres from the nearest lane waypoint
+        self.state.write([robot_id for robot_id, _, _, _ in found], **columns)
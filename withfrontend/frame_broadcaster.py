@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+
+class FrameBroadcaster:
+    """Latest-frame fan-out: producers publish from any thread, async viewers await each new frame"""
+
+    def __init__(self):
+        self.sequence = 0  # Increases by one for every published frame
+        self.subscriber_count = 0
+        self.on_subscribers_changed = None  # Optional callback(count), called on the event loop
+        self._frame = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._waiters = set()  # Futures on self._loop, one per waiting viewer
+
+    def publish(self, frame):
+        with self._lock:
+            self.sequence += 1
+            self._frame = frame
+            loop = self._loop
+        if loop is not None and self._waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake_waiters)
+            except RuntimeError:
+                # Event loop already closed (server shutting down)
+                self._loop = None
+
+    def clear(self):
+        with self._lock:
+            self._frame = None
+
+    def latest(self):
+        with self._lock:
+            return self.sequence, self._frame
+
+    def _wake_waiters(self):
+        waiters, self._waiters = self._waiters, set()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def wait_for_frame(self, after_sequence, timeout=None):
+        """Wait for a frame newer than after_sequence; returns (sequence, frame), frame is None on timeout"""
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            sequence, frame = self.latest()
+            if sequence > after_sequence and frame is not None:
+                return sequence, frame
+            waiter = loop.create_future()
+            self._waiters.add(waiter)
+            # Re-check after registering so a publish in between is not missed
+            sequence, frame = self.latest()
+            if sequence > after_sequence and frame is not None:
+                self._waiters.discard(waiter)
+                return sequence, frame
+            remaining = None if deadline is None else deadline - loop.time()
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                return after_sequence, None
+            finally:
+                # Also drops the future of a viewer that disconnected while waiting
+                self._waiters.discard(waiter)
+
+    async def frames(self, idle_timeout=None):
+        """Yield every new (sequence, frame) exactly once; stops after idle_timeout seconds without frames"""
+        with self._lock:
+            self.subscriber_count += 1
+            # Start from the current frame, if any, so a new viewer sees a picture right away
+            last_sequence = self.sequence - 1 if self._frame is not None else self.sequence
+        self._notify_subscribers_changed()
+        try:
+            while True:
+                sequence, frame = await self.wait_for_frame(last_sequence, idle_timeout)
+                if frame is None:
+                    break
+                last_sequence = sequence
+                yield sequence, frame
+        finally:
+            with self._lock:
+                self.subscriber_count -= 1
+            self._notify_subscribers_changed()
+
+    def _notify_subscribers_changed(self):
+        if self.on_subscribers_changed is None:
+            return
+        try:
+            self.on_subscribers_changed(self.subscriber_count)
+        except Exception as e:
+            print(f"❌ Frame subscriber callback error: {e}")
@@ -0,0 +1,81 @@
+import os
+import threading
+from collections import namedtuple
+import numpy as np
+
+
+FRAME_RING_SLOTS = int(os.environ.get("CARLA_FRAME_RING_SLOTS", "4"))
+
+# data is a read-only (height, width, 3) BGR view into a ring slot
+RawFrame = namedtuple("RawFrame", ["sequence", "frame_id", "timestamp", "data"])
+
+
+class FrameRingBuffer:
+    """Per-camera ring of preallocated contiguous BGR frames, overwriting the oldest slot
+
+    A single writer (the sensor callback) copies each frame in exactly once.
+    Readers get read-only views without copying; a view stays valid until
+    `slots` newer frames have been written, which is_valid() can confirm.
+    """
+
+    def __init__(self, width, height, slots=FRAME_RING_SLOTS, channels=3):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.slots = max(2, slots)
+        self.sequence = 0  # Sequence of the newest complete frame, 0 when empty
+        self._buffers = np.empty((self.slots, height, width, channels), dtype=np.uint8)
+        self._views = []
+        for slot in range(self.slots):
+            view = self._buffers[slot].view()
+            view.flags.writeable = False
+            self._views.append(view)
+        self._sequences = [0] * self.slots  # 0 marks an empty slot or one being written
+        self._frame_ids = [0] * self.slots
+        self._timestamps = [0.0] * self.slots
+        self._cond = threading.Condition()
+
+    def write_bgra(self, raw_data, frame_id, timestamp):
+        """Copy a CARLA BGRA buffer into the next slot, dropping the alpha channel"""
+        source = np.frombuffer(raw_data, dtype=np.uint8).reshape((self.height, self.width, 4))
+        with self._cond:
+            sequence = self.sequence + 1
+            slot = (sequence - 1) % self.slots
+            self._sequences[slot] = 0
+        np.copyto(self._buffers[slot], source[:, :, :self.channels])
+        with self._cond:
+            self._sequences[slot] = sequence
+            self._frame_ids[slot] = frame_id
+            self._timestamps[slot] = timestamp
+            self.sequence = sequence
+            self._cond.notify_all()
+        return sequence
+
+    def _frame_at(self, sequence):
+        # Caller holds the condition lock
+        slot = (sequence - 1) % self.slots
+        if sequence <= 0 or self._sequences[slot] != sequence:
+            return None
+        return RawFrame(sequence, self._frame_ids[slot], self._timestamps[slot], self._views[slot])
+
+    def latest(self):
+        """Newest frame, or None if nothing was written yet"""
+        with self._cond:
+            return self._frame_at(self.sequence)
+
+    def get(self, sequence):
+        """Frame with a given sequence, or None once it has been overwritten"""
+        with self._cond:
+            return self._frame_at(sequence)
+
+    def wait_for_frame(self, after_sequence, timeout=None):
+        """Block until a frame newer than after_sequence exists; returns the newest, or None on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.sequence > after_sequence, timeout):
+                return None
+            return self._frame_at(self.sequence)
+
+    def is_valid(self, frame):
+        """True while the slot behind a frame's view has not been overwritten"""
+        with self._cond:
+            return self._sequences[(frame.sequence - 1) % self.slots] == frame.sequence
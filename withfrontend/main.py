@@ -1,13 +1,43 @@
-from fastapi import FastAPI, Query, Path, HTTPException, Request
-from fastapi.responses import StreamingResponse, HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Query, Path, HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse, HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
-import asyncio
-import json
-import time
-
-from carla_vehicle import CarlaController
-
-app = FastAPI()
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from fastapi.concurrency import run_in_threadpool
+
+from async_controller import AsyncCarlaController, ControllerBackend, RpcExecutor, RpcTimeout
+from shard_proxy import SHARD_WORKERS, ShardPool
+from server_pool import ServerPool, ServersDraining
+from telemetry_hub import TelemetryHub
+from frame_encoder import FrameEncoderPool
+from camera_profiles import CAMERA_PROFILES
+from detection import DetectionService
+from fleet_control import FleetController
+from fleet_telemetry import FleetTelemetry
+from telemetry_ws import serve_telemetry
+from teleop import serve_teleop
+from world_stepper import WorldStepper
+
+
+def shutdown_fleet():
+    """Leave the simulator as we found it: asynchronous mode and none of our actors"""
+    for stepper in WorldStepper.all_instances().values():
+        stepper.stop()
+    print(ControllerBackend.destroy_fleet())
+    ShardPool.shutdown_instance()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if SHARD_WORKERS:
+        # Start the worker processes before the first request instead of inside it
+        await run_in_threadpool(ShardPool.get_instance)
+    yield
+    await run_in_threadpool(shutdown_fleet)
+    RpcExecutor.get_instance().shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 @app.get("/", response_class=HTMLResponse)
@@ -16,147 +46,362 @@ def dashboard():
         return f.read()
 
 
+@app.exception_handler(RpcTimeout)
+async def rpc_timeout_handler(request, exc):
+    # The simulator did not answer in time; the event loop itself never waited on it
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.exception_handler(ServersDraining)
+async def servers_draining_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+def get_controller_or_404(robot_id):
+    """Async facade of an existing robot's controller; unknown robots are a 404, never created implicitly"""
+    controller = AsyncCarlaController.lookup(robot_id)
+    if controller is None:
+        raise HTTPException(status_code=404, detail=f"Robot {robot_id} not found")
+    return controller
+
+
 # Robot management endpoints
+@app.post("/robots/bulk_spawn")
+async def bulk_spawn(count: int = Query(..., ge=1, le=500), prefix: str = Query("robot")):
+    # Claim the next unused ids, then spawn every vehicle with one batched command
+    with ControllerBackend.registry.claim(prefix, count) as robot_ids:
+        results = await AsyncCarlaController.spawn_fleet(robot_ids)
+    return {
+        "spawned": [robot_id for robot_id in robot_ids if robot_id in ControllerBackend.registry],
+        "results": results
+    }
+
+
 @app.post("/robots/{robot_id}")
-def create_robot(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
+async def create_robot(robot_id: str):
+    controller = await AsyncCarlaController.get_instance(robot_id)
     return {"message": f"Robot {robot_id} created successfully"}
 
 
 @app.delete("/robots/{robot_id}")
-def delete_robot(robot_id: str):
-    return {"message": CarlaController.destroy_instance(robot_id)}
+async def delete_robot(robot_id: str):
+    return {"message": await AsyncCarlaController.destroy_instance(robot_id)}
+
+
+@app.delete("/robots")
+async def destroy_robots(robot_id: Optional[List[str]] = Query(None)):
+    # All robots, or only the given ?robot_id=a&robot_id=b, with one batched actor teardown
+    return {"message": await AsyncCarlaController.destroy_fleet(robot_id)}
 
 
 @app.get("/robots")
 def list_robots():
-    return {"robots": list(CarlaController._instances.keys())}
+    controllers = ControllerBackend.registry.controllers()
+    return {
+        "robots": [c.robot_id for c in controllers],
+        "placement": {c.robot_id: c.server for c in controllers}
+    }
 
 
 # Robot-specific endpoints
 @app.get("/robots/{robot_id}/status")
 def get_robot_status(robot_id: str):
-    if robot_id not in CarlaController._instances:
-        raise HTTPException(status_code=404, detail=f"Robot {robot_id} not found")
-
-    controller = CarlaController.get_instance(robot_id)
+    controller = get_controller_or_404(robot_id)
     return {
         "robot_id": robot_id,
         "vehicle": controller.vehicle is not None,
         "camera_attached": controller.camera is not None,
         "telemetry_running": controller.telemetry_running,
-        "video_streaming": controller.current_frame is not None,
+        "video_streaming": controller.streaming,
+        "camera_paused": controller.camera_paused,
+        "frame_export": controller.frame_exporter.name if controller.frame_exporter else None,
         "detection_running": controller.detection_running
     }
 
 
 @app.post("/robots/{robot_id}/spawn")
-def spawn_robot_vehicle(robot_id: str, x: float = Query(...), y: float = Query(...), z: float = Query(...)):
-    if robot_id not in CarlaController._instances:
-        raise HTTPException(status_code=404, detail=f"Robot {robot_id} not found")
-
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.spawn_vehicle(x, y, z)}
+async def spawn_robot_vehicle(robot_id: str, x: float = Query(...), y: float = Query(...), z: float = Query(...)):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.spawn_vehicle(x, y, z)}
 
 
 @app.post("/robots/{robot_id}/destroy_vehicle")
-def destroy_robot_vehicle(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.destroy_vehicle()}
+async def destroy_robot_vehicle(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.destroy_vehicle()}
 
 
 @app.post("/robots/{robot_id}/start_drive")
-def start_robot_drive(robot_id: str, x: float = Query(...), y: float = Query(...), z: float = Query(...)):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.start_drive(x, y, z)}
+async def start_robot_drive(robot_id: str, x: float = Query(...), y: float = Query(...), z: float = Query(...)):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.start_drive(x, y, z)}
 
 
 @app.post("/robots/{robot_id}/stop_drive")
-def stop_robot_drive(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.stop_drive()}
+async def stop_robot_drive(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.stop_drive()}
 
 
 @app.post("/robots/{robot_id}/start_telemetry")
-def start_robot_telemetry(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.start_telemetry()}
+async def start_robot_telemetry(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.start_telemetry()}
 
 
 @app.post("/robots/{robot_id}/stop_telemetry")
-def stop_robot_telemetry(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.stop_telemetry()}
+async def stop_robot_telemetry(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.stop_telemetry()}
+
+
+@app.websocket("/robots/{robot_id}/control")
+async def robot_control_websocket(websocket: WebSocket, robot_id: str):
+    controller = ControllerBackend.lookup(robot_id)
+    if controller is None:
+        await websocket.close(code=1008, reason=f"Robot {robot_id} not found")
+        return
+    await serve_teleop(websocket, controller)
 
 
 @app.get("/robots/{robot_id}/stream_data")
 async def stream_robot_data(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
+    controller = get_controller_or_404(robot_id)
+    # All viewers of a robot share one producer and the same encoded messages
+    hub = TelemetryHub.get_instance(robot_id, controller.get_telemetry, interval=0.2)
+
+    return StreamingResponse(hub.stream(), media_type="text/event-stream")
 
-    async def event_generator():
-        while True:
-            data = controller.get_telemetry()
-            if data:
-                yield f"data: {json.dumps(data)}\n\n"
-            await asyncio.sleep(0.2)
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+@app.get("/camera_profiles")
+def list_camera_profiles():
+    return {"profiles": {name: p.to_dict() for name, p in CAMERA_PROFILES.items()}}
 
 
 @app.post("/robots/{robot_id}/attach_camera")
-def attach_robot_camera(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.attach_camera()}
+async def attach_robot_camera(
+    robot_id: str,
+    profile: str = Query("default"),
+    width: Optional[int] = Query(None),
+    height: Optional[int] = Query(None),
+    fov: Optional[float] = Query(None),
+    fps: Optional[float] = Query(None),
+    quality: Optional[int] = Query(None),
+    mount_x: Optional[float] = Query(None),
+    mount_y: Optional[float] = Query(None),
+    mount_z: Optional[float] = Query(None),
+    pitch: Optional[float] = Query(None)
+):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.attach_camera(
+        profile, width=width, height=height, fov=fov, fps=fps, quality=quality,
+        mount_x=mount_x, mount_y=mount_y, mount_z=mount_z, pitch=pitch)}
 
 
 @app.post("/robots/{robot_id}/detach_camera")
-def detach_robot_camera(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.detach_camera()}
+async def detach_robot_camera(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.detach_camera()}
 
 
 @app.post("/robots/{robot_id}/start_streaming")
-def start_robot_streaming(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.start_streaming()}
+async def start_robot_streaming(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.start_streaming()}
 
 
 @app.post("/robots/{robot_id}/stop_streaming")
-def stop_robot_streaming(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.stop_streaming()}
+async def stop_robot_streaming(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.stop_streaming()}
+
+
+@app.post("/robots/{robot_id}/start_frame_export")
+async def start_robot_frame_export(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.start_frame_export()}
+
+
+@app.post("/robots/{robot_id}/stop_frame_export")
+async def stop_robot_frame_export(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.stop_frame_export()}
 
 
 @app.get("/robots/{robot_id}/video_feed")
-def robot_video_feed(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
+async def robot_video_feed(robot_id: str):
+    controller = get_controller_or_404(robot_id)
 
-    def frame_generator():
-        while True:
-            frame = controller.get_current_frame()
-            if frame:
-                yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame + b"\r\n"
-            time.sleep(0.1)
+    async def frame_generator():
+        # Each viewer awaits the next new frame instead of polling a worker thread
+        async for _, frame in controller.frame_broadcaster.frames():
+            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame + b"\r\n"
 
     return StreamingResponse(frame_generator(), media_type="multipart/x-mixed-replace; boundary=frame")
 
 
+@app.get("/encoder/stats")
+def encoder_stats():
+    return {"stats": FrameEncoderPool.get_instance().get_stats()}
+
+
 @app.post("/robots/{robot_id}/start_detection")
-def start_robot_detection(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.start_detection()}
+async def start_robot_detection(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.start_detection()}
 
 
 @app.post("/robots/{robot_id}/stop_detection")
-def stop_robot_detection(robot_id: str):
-    controller = CarlaController.get_instance(robot_id)
-    return {"message": controller.stop_detection()}
+async def stop_robot_detection(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"message": await controller.stop_detection()}
+
+
+@app.get("/robots/{robot_id}/detections")
+async def robot_detections_stream(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    hub = TelemetryHub.get_instance(f"{robot_id}/detections", controller.get_detections, interval=0.05)
+    return StreamingResponse(hub.stream(), media_type="text/event-stream", headers={'Cache-Control': 'no-cache'})
+
+
+@app.get("/robots/{robot_id}/detections/latest")
+def robot_detections_latest(robot_id: str):
+    controller = get_controller_or_404(robot_id)
+    return {"result": controller.get_detections()}
+
+
+@app.get("/detection/stats")
+def detection_stats():
+    return {"stats": DetectionService.get_instance().get_stats()}
+
+
+@app.post("/detection/config")
+def configure_detection(batch_size: Optional[int] = Query(None), max_latency: Optional[float] = Query(None)):
+    return {"config": DetectionService.get_instance().configure(batch_size, max_latency)}
+
+
+def parse_fields(fields):
+    return [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+
+
+@app.get("/fleet/telemetry")
+def fleet_telemetry(
+    robot_id: Optional[List[str]] = Query(None),
+    fields: Optional[str] = Query(None),
+    columnar: bool = Query(False)
+):
+    # Every robot with telemetry in one payload; ?robot_id=a&robot_id=b&fields=x,y,speed&columnar=true
+    try:
+        return FleetTelemetry.fleet_snapshot(robot_id, parse_fields(fields), columnar)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/fleet/stream")
+async def fleet_stream(
+    robot_id: Optional[List[str]] = Query(None),
+    fields: Optional[str] = Query(None),
+    columnar: bool = Query(False),
+    interval: float = Query(0.1, ge=0.02)
+):
+    field_list = parse_fields(fields)
+    try:
+        FleetTelemetry.fleet_snapshot([], field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Viewers asking for the same slice share one producer and the same encoded messages
+    robot_ids = sorted(set(robot_id)) if robot_id else None
+    key = ("fleet", tuple(robot_ids or ()), tuple(field_list or ()), columnar, interval)
+    hub = TelemetryHub.get_instance(
+        key, lambda: FleetTelemetry.fleet_snapshot(robot_ids, field_list, columnar), interval=interval)
+
+    return StreamingResponse(
+        hub.stream(),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache'}
+    )
+
+
+@app.websocket("/fleet/ws")
+async def fleet_websocket(
+    websocket: WebSocket,
+    robot_id: Optional[List[str]] = Query(None),
+    fields: Optional[str] = Query(None),
+    encoding: Optional[str] = Query(None),
+    rate: float = Query(20.0, gt=0, le=100),
+    delta: bool = Query(False)
+):
+    # Encoding comes from the WebSocket subprotocol (carla.telemetry.struct / .msgpack) or ?encoding=
+    robot_ids = sorted(set(robot_id)) if robot_id else None
+    await serve_telemetry(websocket, robot_ids, parse_fields(fields), encoding, rate, delta)
+
+
+@app.get("/fleet/control/stats")
+def fleet_control_stats():
+    return {"stats": {endpoint: fleet.get_stats() for endpoint, fleet in FleetController.all_instances().items()}}
+
+
+@app.post("/fleet/control/config")
+def configure_fleet_control(
+    hz: Optional[float] = Query(None),
+    kp: Optional[float] = Query(None),
+    ki: Optional[float] = Query(None),
+    kd: Optional[float] = Query(None)
+):
+    return {"config": {endpoint: fleet.configure(hz, kp, ki, kd) for endpoint, fleet in FleetController.all_instances().items()}}
+
+
+def get_steppers():
+    """One stepper per configured CARLA server"""
+    pool = ServerPool.get_instance()
+    return [WorldStepper.get_instance(pool.connection(endpoint, timeout=10.0)) for endpoint in pool.servers]
+
+
+@app.post("/world/sync/start")
+async def start_sync_stepping(delta: Optional[float] = Query(None), max_speed: bool = Query(False)):
+    if SHARD_WORKERS:
+        return {"message": "⚠️ Synchronous stepping is not available while robots run in shard workers."}
+    # Connecting and switching world settings are simulator round trips, so they run on the RPC executor
+    return {"message": await RpcExecutor.get_instance().run(
+        "sync_start", lambda: "; ".join(f"{s.connection.endpoint}: {s.start(delta, max_speed)}" for s in get_steppers()))}
+
+
+@app.post("/world/sync/stop")
+async def stop_sync_stepping():
+    if SHARD_WORKERS:
+        return {"message": "⚠️ Synchronous stepping is not available while robots run in shard workers."}
+    return {"message": await RpcExecutor.get_instance().run(
+        "sync_stop", lambda: "; ".join(f"{s.connection.endpoint}: {s.stop()}" for s in get_steppers()))}
+
+
+@app.get("/world/sync/stats")
+async def sync_stepping_stats():
+    if SHARD_WORKERS:
+        return {"message": "⚠️ Synchronous stepping is not available while robots run in shard workers."}
+    steppers = await RpcExecutor.get_instance().run("connect", get_steppers)
+    return {"stats": {stepper.connection.endpoint: stepper.get_stats() for stepper in steppers}}
+
+
+@app.get("/servers")
+async def list_servers():
+    return {"stats": await RpcExecutor.get_instance().run("servers", ControllerBackend.servers)}
+
+
+@app.post("/servers/drain")
+async def drain_server(endpoint: str = Query(...), draining: bool = Query(True)):
+    # Robots already on the server stay; only new robots are placed elsewhere
+    return {"message": await RpcExecutor.get_instance().run("drain", ControllerBackend.drain, endpoint, draining)}
+
+
+@app.get("/rpc/stats")
+def rpc_stats():
+    return {"stats": RpcExecutor.get_instance().get_stats()}
 
 
 # Backward compatibility endpoints - redirect to robot-specific endpoints
 @app.get("/active_robot", response_class=HTMLResponse)
 def get_active_robot():
-    robots = list(CarlaController._instances.keys())
+    robots = ControllerBackend.registry.ids()
     if robots:
         return robots[0]  # Return first robot
     raise HTTPException(status_code=404, detail="No robots available")
@@ -220,9 +465,16 @@ async def stream_data_compat():
 
 
 @app.post("/attach_camera")
-async def attach_camera_compat():
+async def attach_camera_compat(request: Request):
+    params = dict(request.query_params)
     robot_id = await get_active_robot_or_error()
-    return RedirectResponse(url=f"/robots/{robot_id}/attach_camera", status_code=307)
+
+    redirect_url = f"/robots/{robot_id}/attach_camera"
+    if params:
+        query_string = "&".join([f"{k}={v}" for k, v in params.items()])
+        redirect_url += f"?{query_string}"
+
+    return RedirectResponse(url=redirect_url, status_code=307)
 
 
 @app.post("/detach_camera")
@@ -263,7 +515,7 @@ async def stop_detection_compat():
 
 # Helper function
 async def get_active_robot_or_error():
-    robots = list(CarlaController._instances.keys())
+    robots = ControllerBackend.registry.ids()
     if not robots:
         raise HTTPException(status_code=404, detail="No robots available. Please create a robot first.")
     return robots[0]
\ No newline at end of file
@@ -0,0 +1,455 @@
+import bisect
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client
+import numpy as np
+from controller_registry import ControllerRegistry
+from fleet_state import STATE_DTYPE, row_to_dict
+from fleet_telemetry import FleetTelemetry
+from frame_broadcaster import FrameBroadcaster
+
+
+SHARD_WORKERS = int(os.environ.get("CARLA_SHARD_WORKERS", "0"))  # 0 hosts every robot in the API process
+SHARD_STATE_INTERVAL = float(os.environ.get("CARLA_SHARD_STATE_INTERVAL", "0.05"))  # Seconds between state pulls
+
+# Controller methods a front end may call on a robot hosted by a shard worker
+PROXIED_METHODS = (
+    "spawn_vehicle", "destroy_vehicle", "start_drive", "stop_drive", "start_telemetry", "stop_telemetry",
+    "get_telemetry", "attach_camera", "detach_camera", "start_streaming", "stop_streaming",
+    "start_frame_export", "stop_frame_export", "start_detection", "stop_detection",
+)
+
+
+class ShardError(RuntimeError):
+    """A shard worker failed a request or could not be reached"""
+
+
+class HashRing:
+    """Consistent hashing of robot ids onto shards; adding a shard only moves about 1/N of the robots"""
+
+    def __init__(self, nodes, replicas=64):
+        points = sorted((self._hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def node_for(self, key):
+        i = bisect.bisect(self._hashes, self._hash(str(key))) % len(self._hashes)
+        return self._nodes[i]
+
+
+class Shard:
+    """Front-end handle on one worker process: a pool of socket connections and the state it last reported"""
+
+    def __init__(self, index, address, authkey, process):
+        self.index = index
+        self.address = address
+        self.authkey = authkey
+        self.process = process
+        self._idle = []  # Connections not in use by a request
+        self._lock = threading.Lock()
+        self.ids = []
+        self.rows = np.zeros(0, dtype=STATE_DTYPE)
+        self.info = {}  # robot_id -> status flags, vehicle and latest detections
+
+    def connect(self):
+        return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+
+    def wait_ready(self, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._idle.append(self.connect())
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not self.process.is_alive() or time.monotonic() > deadline:
+                    raise ShardError(f"Shard {self.index} did not start")
+                time.sleep(0.05)
+
+    def request(self, op, *args):
+        """Send one request and wait for its reply; each connection carries one request at a time"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        try:
+            if conn is None:
+                conn = self.connect()
+            conn.send((op, args))
+            status, result = conn.recv()
+        except (EOFError, OSError) as e:
+            if conn is not None:
+                conn.close()
+            raise ShardError(f"Shard {self.index} unavailable: {e}")
+        with self._lock:
+            self._idle.append(conn)
+        if status == "error":
+            raise ShardError(result)
+        return result
+
+    def update_info(self, robot_id, info):
+        with self._lock:
+            self.info = dict(self.info, **{robot_id: info})
+
+    def set_state(self, ids, rows, info):
+        with self._lock:
+            self.ids, self.rows, self.info = ids, rows, info
+
+    def state(self):
+        with self._lock:
+            return self.ids, self.rows, self.info
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=5.0)
+
+
+class ShardPool:
+    """Worker processes that each own the controllers of the robots hashed onto them
+
+    Robot ids are placed with a consistent hash ring. Each worker is a separate
+    process with its own GIL, camera callbacks, encoders and fleet loops, and
+    answers requests on a Unix socket. One thread pulls every worker's fleet
+    state, status flags and detections each SHARD_STATE_INTERVAL, so reads in
+    the API process never wait on a worker.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(SHARD_WORKERS)
+            return cls._instance
+
+    @classmethod
+    def shutdown_instance(cls):
+        with cls._instance_lock:
+            pool, cls._instance = cls._instance, None
+        if pool is not None:
+            pool.shutdown()
+
+    def __init__(self, workers=SHARD_WORKERS):
+        import shard_worker  # shard_worker imports this module, so it can only be imported once this one has loaded
+        self._dir = tempfile.mkdtemp(prefix="carla-shards-")
+        authkey = os.urandom(16)
+        context = multiprocessing.get_context("spawn")
+        self.shards = []
+        try:
+            for i in range(max(1, workers)):
+                address = os.path.join(self._dir, f"shard-{i}.sock")
+                process = context.Process(target=shard_worker.serve, args=(address, authkey),
+                                          name=f"carla-shard-{i}", daemon=True)
+                process.start()
+                self.shards.append(Shard(i, address, authkey, process))
+            for shard in self.shards:
+                shard.wait_ready()
+        except BaseException:
+            # Do not leave the workers that did start (and their sockets) behind
+            for shard in self.shards:
+                shard.close()
+            shutil.rmtree(self._dir, ignore_errors=True)
+            raise
+        self.ring = HashRing(range(len(self.shards)))
+        self.executor = ThreadPoolExecutor(max_workers=4 * len(self.shards), thread_name_prefix="carla-shard")
+        self.running = True
+        threading.Thread(target=self._poll_state, name="shard-state", daemon=True).start()
+        FleetTelemetry.add_source(self.fleet_rows)
+        print(f"✅ Started {len(self.shards)} shard workers")
+
+    def shard_for(self, robot_id):
+        return self.shards[self.ring.node_for(robot_id)]
+
+    def group(self, robot_ids):
+        """{shard: [robot_id, ...]} for a list of robots"""
+        groups = {}
+        for robot_id in robot_ids:
+            groups.setdefault(self.shard_for(robot_id), []).append(robot_id)
+        return groups
+
+    def on_each(self, groups, op):
+        """Run op(shard, robot_ids) for every group in parallel; returns {shard: result}"""
+        futures = {shard: self.executor.submit(op, shard, ids) for shard, ids in groups.items()}
+        return {shard: future.result() for shard, future in futures.items()}
+
+    def _poll_state(self):
+        while self.running:
+            started = time.monotonic()
+            for shard in self.shards:
+                try:
+                    shard.set_state(*shard.request("state"))
+                except ShardError as e:
+                    if self.running:
+                        print(f"⚠️ Could not read state of shard {shard.index}: {e}")
+            time.sleep(max(0.0, SHARD_STATE_INTERVAL - (time.monotonic() - started)))
+
+    def fleet_rows(self):
+        """(robot_ids, rows) of every robot across all shards, as last reported"""
+        ids, parts = [], []
+        for shard in self.shards:
+            shard_ids, rows, _ = shard.state()
+            ids.extend(shard_ids)
+            parts.append(rows)
+        return ids, np.concatenate(parts) if parts else np.zeros(0, dtype=STATE_DTYPE)
+
+    def shutdown(self):
+        self.running = False
+        FleetTelemetry.remove_source(self.fleet_rows)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for shard in self.shards:
+            shard.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def _forward(name):
+    def call(self, *args, **kwargs):
+        result, info = self.shard.request("call", self.robot_id, name, args, kwargs)
+        self.shard.update_info(self.robot_id, info)
+        return result
+    call.__name__ = name
+    call.__doc__ = f"CarlaController.{name} on the robot's shard worker"
+    return call
+
+
+class ShardedController:
+    """Proxy for a robot whose CarlaController lives in a shard worker process
+
+    Mirrors the parts of CarlaController the API uses. Commands are forwarded
+    over the shard's Unix socket. Telemetry, detections and status flags come
+    from the state the pool pulls from every shard, and video is relayed into
+    a local FrameBroadcaster only while someone is watching.
+    """
+    registry = ControllerRegistry()
+
+    @classmethod
+    def get_instance(cls, robot_id):
+        """Get or create the proxy, creating the controller on its shard first"""
+        return cls.registry.get_or_create(robot_id, cls._create)
+
+    @classmethod
+    def _create(cls, robot_id):
+        shard = ShardPool.get_instance().shard_for(robot_id)
+        # The worker raises if it cannot reach the simulator, so no proxy is registered
+        shard.update_info(robot_id, shard.request("create", robot_id))
+        return cls(robot_id, shard)
+
+    @classmethod
+    def lookup(cls, robot_id):
+        return cls.registry.get(robot_id)
+
+    @classmethod
+    def destroy_instance(cls, robot_id):
+        controller = cls.registry.pop(robot_id)
+        if controller is None:
+            return f"No controller for robot {robot_id} exists"
+        controller._stop_relay()
+        return controller.shard.request("destroy_instance", robot_id)
+
+    @classmethod
+    def spawn_fleet(cls, robot_ids):
+        """Spawn on every shard in parallel, each with its own batched command; returns {robot_id: message}"""
+        pool = ShardPool.get_instance()
+        results = {}
+        for shard, (shard_results, info) in pool.on_each(
+                pool.group(robot_ids), lambda shard, ids: shard.request("spawn_fleet", ids)).items():
+            results.update(shard_results)
+            for robot_id, robot_info in info.items():
+                shard.update_info(robot_id, robot_info)
+                cls.registry.get_or_create(robot_id, lambda rid: cls(rid, shard))
+        return results
+
+    @classmethod
+    def destroy_fleet(cls, robot_ids=None):
+        """Tear down several robots (all when robot_ids is None), one batched teardown per shard"""
+        if robot_ids is None:
+            robot_ids = cls.registry.ids()
+        controllers = [c for c in (cls.registry.pop(robot_id) for robot_id in robot_ids) if c is not None]
+        if not controllers:
+            return "0 robots destroyed (0 actors removed)"
+        for controller in controllers:
+            controller._stop_relay()
+        pool = ShardPool.get_instance()
+        messages = pool.on_each(pool.group([c.robot_id for c in controllers]),
+                                lambda shard, ids: shard.request("destroy_fleet", ids))
+        return "; ".join(f"shard {shard.index}: {message}" for shard, message in messages.items())
+
+    @classmethod
+    def servers(cls):
+        """Placement state of every CARLA server, summed over the shards' own server pools"""
+        pool = ShardPool.get_instance()
+        merged = {}
+        for stats in pool.on_each({shard: None for shard in pool.shards}, lambda shard, _: shard.request("servers")).values():
+            for endpoint, server in stats.items():
+                total = merged.setdefault(endpoint, dict(server, robots=0))
+                total["robots"] += server["robots"]
+                total["connected"] = total["connected"] or server["connected"]
+                total["draining"] = total["draining"] or server["draining"]
+        return merged
+
+    @classmethod
+    def drain(cls, endpoint, draining=True):
+        """Stop (or resume) placing new robots on a server, in every shard"""
+        pool = ShardPool.get_instance()
+        messages = pool.on_each({shard: None for shard in pool.shards},
+                                lambda shard, _: shard.request("drain", endpoint, draining))
+        return next(iter(messages.values()))
+
+    def __init__(self, robot_id, shard):
+        self.robot_id = robot_id
+        self.shard = shard
+        self.initialized = True
+        self.frame_broadcaster = FrameBroadcaster()
+        self.frame_broadcaster.on_subscribers_changed = self._on_viewers_changed
+        self._relay = None  # Stop event of the thread copying frames from the worker while there are viewers
+        self._telemetry_requested = 0.0
+        self._control_lock = threading.Lock()
+        self._pending_control = None  # Newest control not yet sent: (control, ack, submitted at)
+        self._control_sending = False  # One send per robot in flight, so commands reach the worker in order
+
+    spawn_vehicle = _forward("spawn_vehicle")
+    destroy_vehicle = _forward("destroy_vehicle")
+    start_drive = _forward("start_drive")
+    stop_drive = _forward("stop_drive")
+    start_telemetry = _forward("start_telemetry")
+    stop_telemetry = _forward("stop_telemetry")
+    attach_camera = _forward("attach_camera")
+    detach_camera = _forward("detach_camera")
+    start_streaming = _forward("start_streaming")
+    stop_streaming = _forward("stop_streaming")
+    start_frame_export = _forward("start_frame_export")
+    stop_frame_export = _forward("stop_frame_export")
+    start_detection = _forward("start_detection")
+    stop_detection = _forward("stop_detection")
+
+    def _info(self):
+        return self.shard.state()[2].get(self.robot_id) or {}
+
+    @property
+    def vehicle(self):
+        return self._info().get("vehicle_id")
+
+    @property
+    def server(self):
+        return self._info().get("server")
+
+    @property
+    def camera(self):
+        return True if self._info().get("camera_attached") else None
+
+    @property
+    def frame_exporter(self):
+        name = self._info().get("frame_export")
+        return types.SimpleNamespace(name=name) if name else None
+
+    def __getattr__(self, name):
+        # Status flags: telemetry_running, streaming, camera_paused, detection_running, navigation_running
+        if name in ("telemetry_running", "streaming", "camera_paused", "detection_running", "navigation_running"):
+            return bool(self._info().get(name))
+        raise AttributeError(name)
+
+    def get_telemetry(self):
+        """Telemetry from the last state pulled from the shard; never blocks on the worker"""
+        ids, rows, info = self.shard.state()
+        robot_info = info.get(self.robot_id) or {}
+        if self.robot_id in ids:
+            data = row_to_dict(rows[ids.index(self.robot_id)])
+            data["vehicle_id"] = robot_info.get("vehicle_id")
+            data["vehicle_type"] = robot_info.get("vehicle_type")
+            return data
+        now = time.monotonic()
+        if robot_info.get("vehicle_id") is not None and now - self._telemetry_requested > 1.0:
+            # Let the worker start telemetry the way a local controller would on first read
+            self._telemetry_requested = now
+            ShardPool.get_instance().executor.submit(self.shard.request, "call", self.robot_id, "get_telemetry", (), {})
+        return {}
+
+    def get_detections(self):
+        return self._info().get("detections")
+
+    def submit_control(self, throttle=0.0, steer=0.0, brake=0.0, hand_brake=False, reverse=False, ack=None):
+        """Queue a direct control on the worker's fleet loop; ack(status, latency_ms) is called when it reports back"""
+        if self.vehicle is None:
+            return "No vehicle spawned."
+        control = {"throttle": throttle, "steer": steer, "brake": brake, "hand_brake": hand_brake, "reverse": reverse}
+        submitted = time.monotonic()
+        with self._control_lock:
+            # Latest wins here as on the worker: a command still waiting behind the one in flight is replaced
+            previous, self._pending_control = self._pending_control, (control, ack, submitted)
+            start = not self._control_sending
+            self._control_sending = True
+        if previous is not None and previous[1] is not None:
+            previous[1]("superseded", (submitted - previous[2]) * 1000.0)
+        if start:
+            ShardPool.get_instance().executor.submit(self._send_controls)
+        return "Control queued."
+
+    def _send_controls(self):
+        # Sends pending controls one at a time until none is left; holds one pool thread per steering robot
+        while True:
+            with self._control_lock:
+                pending, self._pending_control = self._pending_control, None
+                if pending is None:
+                    self._control_sending = False
+                    return
+            control, ack, submitted = pending
+            queued_ms = (time.monotonic() - submitted) * 1000.0
+            try:
+                status, latency_ms = self.shard.request("submit_control", self.robot_id, control)
+            except ShardError as e:
+                print(f"❌ Control for robot {self.robot_id} failed: {e}")
+                status, latency_ms = "rejected", 0.0
+            if ack is not None:
+                ack(status, queued_ms + latency_ms)
+
+    def _on_viewers_changed(self, count):
+        if count > 0 and self._relay is None:
+            self._relay = threading.Event()
+            threading.Thread(target=self._relay_frames, args=(self._relay,),
+                             name=f"frame-relay-{self.robot_id}", daemon=True).start()
+        elif count == 0:
+            self._stop_relay()
+
+    def _stop_relay(self):
+        relay, self._relay = self._relay, None
+        if relay is not None:
+            relay.set()
+
+    def _relay_frames(self, stop):
+        # The worker counts this relay as a viewer, so its camera idles exactly as a local one would
+        try:
+            conn = self.shard.connect()
+        except OSError as e:
+            print(f"❌ Frame relay for robot {self.robot_id} failed: {e}")
+            if self._relay is stop:
+                self._relay = None
+            return
+        try:
+            conn.send(("frames", (self.robot_id,)))
+            status, detail = conn.recv()
+            if status == "error":
+                print(f"❌ Frame relay for robot {self.robot_id} failed: {detail}")
+                return
+            while not stop.is_set():
+                frame = conn.recv_bytes()  # Empty keepalives arrive at least once a second
+                if frame:
+                    self.frame_broadcaster.publish(frame)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            if self._relay is stop:
+                self._relay = None
@@ -0,0 +1,89 @@
+import asyncio
+import json
+from fastapi import WebSocketDisconnect
+from async_controller import RpcExecutor, RpcTimeout
+
+
+# Robot actions that can be sent on the command channel instead of separate HTTP calls
+ACTIONS = {
+    "spawn": lambda c, m: c.spawn_vehicle(m.get("x"), m.get("y"), m.get("z")),
+    "destroy_vehicle": lambda c, m: c.destroy_vehicle(),
+    "start_drive": lambda c, m: c.start_drive(float(m["x"]), float(m["y"]), float(m["z"])),
+    "stop_drive": lambda c, m: c.stop_drive(),
+    "start_telemetry": lambda c, m: c.start_telemetry(),
+    "stop_telemetry": lambda c, m: c.stop_telemetry(),
+}
+
+
+async def _send_outbox(websocket, outbox):
+    # Single writer, so acks from the control loop and action results never interleave
+    while True:
+        await websocket.send_text(json.dumps(await outbox.get()))
+
+
+async def serve_teleop(websocket, controller):
+    """Persistent command channel for one robot
+
+    Control messages ({"seq": 1, "throttle": 0.5, "steer": 0.1, "brake": 0}) go
+    into the fleet controller's latest-wins mailbox and are applied with every
+    other robot in its next batch; each one is acked with its status and the
+    submit-to-apply latency. Messages with an "action" (see ACTIONS) run the
+    matching controller method and reply with its message. The vehicle is
+    braked when the channel closes.
+    """
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    outbox = asyncio.Queue()
+    sender = loop.create_task(_send_outbox(websocket, outbox))
+
+    def ack_for(seq):
+        def ack(status, latency_ms):
+            # Called from the control loop thread
+            loop.call_soon_threadsafe(outbox.put_nowait, {
+                "type": "ack", "seq": seq, "status": status, "latency_ms": round(latency_ms, 3)})
+        return ack
+
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                if not isinstance(message, dict):
+                    raise ValueError("Expected a JSON object")
+            except ValueError as e:
+                outbox.put_nowait({"type": "error", "seq": None, "detail": str(e)})
+                continue
+            seq = message.get("seq")
+
+            action = message.get("action")
+            if action is None:
+                try:
+                    result = controller.submit_control(
+                        message.get("throttle", 0.0), message.get("steer", 0.0), message.get("brake", 0.0),
+                        message.get("hand_brake", False), message.get("reverse", False), ack=ack_for(seq))
+                except (TypeError, ValueError) as e:
+                    outbox.put_nowait({"type": "error", "seq": seq, "detail": str(e)})
+                    continue
+                if result != "Control queued.":
+                    outbox.put_nowait({"type": "ack", "seq": seq, "status": "rejected", "latency_ms": 0.0,
+                                       "message": result})
+            elif action in ACTIONS:
+                try:
+                    result = await RpcExecutor.get_instance().run(action, ACTIONS[action], controller, message)
+                except (KeyError, TypeError, ValueError) as e:
+                    outbox.put_nowait({"type": "error", "seq": seq, "detail": f"Bad {action} parameters: {e}"})
+                    continue
+                except RpcTimeout as e:
+                    outbox.put_nowait({"type": "error", "seq": seq, "detail": str(e)})
+                    continue
+                outbox.put_nowait({"type": "result", "seq": seq, "action": action, "message": result})
+            else:
+                outbox.put_nowait({"type": "error", "seq": seq,
+                                   "detail": f"Unknown action '{action}', choose from {sorted(ACTIONS)}"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        sender.cancel()
+        # Nobody is steering any more, so hold the vehicle instead of leaving the last throttle applied
+        if controller.vehicle is not None and not controller.navigation_running:
+            controller.submit_control(brake=1.0)
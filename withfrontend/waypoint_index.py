@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+import numpy as np
+from route_planner import ROUTE_CACHE_DIR
+
+
+WAYPOINT_RESOLUTION = 2.0  # Metres between indexed waypoints
+
+
+class WaypointIndex:
+    """Grid index over map.generate_waypoints(), answering lane queries for one or many positions in-process
+
+    Every query accepts a single (x, y[, z]) position or an (N, 2|3) array and
+    is vectorized over the positions, so a whole fleet can be served in one
+    NumPy pass without asking the simulator.
+    """
+    _instances = {}  # Dictionary to store indexes by map name
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_map(cls, carla_map, resolution=WAYPOINT_RESOLUTION, cache_dir=ROUTE_CACHE_DIR):
+        """Get the index for a map, loading it from disk or building it on first use"""
+        key = (carla_map.name, resolution)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls._load_or_build(carla_map, resolution, cache_dir)
+            return cls._instances[key]
+
+    @classmethod
+    def _load_or_build(cls, carla_map, resolution, cache_dir):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", carla_map.name)
+        path = os.path.join(cache_dir, f"waypoints_{safe_name}_{resolution:g}.npz") if cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    index = cls(resolution, **{k: data[k] for k in data.files})
+                print(f"🗺️ Loaded waypoint index for {carla_map.name} from {path}")
+                return index
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable waypoint index cache {path}: {e}")
+
+        index = cls.build(carla_map, resolution)
+        if path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+                np.savez(tmp_path, positions=index.positions, yaw=index.yaw, road_id=index.road_id,
+                         lane_id=index.lane_id, lane_width=index.lane_width, next_index=index.next_index)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ Could not cache waypoint index to {path}: {e}")
+        return index
+
+    @classmethod
+    def build(cls, carla_map, resolution=WAYPOINT_RESOLUTION):
+        waypoints = carla_map.generate_waypoints(resolution)
+        positions = np.array([[w.transform.location.x, w.transform.location.y, w.transform.location.z]
+                              for w in waypoints], dtype=np.float64).reshape(-1, 3)
+        yaw = np.array([w.transform.rotation.yaw for w in waypoints], dtype=np.float64)
+        road_id = np.array([w.road_id for w in waypoints], dtype=np.int64)
+        lane_id = np.array([w.lane_id for w in waypoints], dtype=np.int64)
+        lane_width = np.array([w.lane_width for w in waypoints], dtype=np.float64)
+        index = cls(resolution, positions, yaw, road_id, lane_id, lane_width)
+
+        # Successor of each waypoint along its lane, resolved once against the index itself
+        successors = np.arange(len(waypoints))
+        nexts = [w.next(resolution) for w in waypoints]
+        has_next = np.array([bool(n) for n in nexts])
+        if has_next.any():
+            next_positions = np.array([[n[0].transform.location.x, n[0].transform.location.y, n[0].transform.location.z]
+                                       for n in nexts if n], dtype=np.float64)
+            successors[has_next] = index.nearest(next_positions)
+        index.next_index = successors
+        print(f"🗺️ Built waypoint index for {carla_map.name}: {len(waypoints)} waypoints")
+        return index
+
+    def __init__(self, resolution, positions, yaw, road_id, lane_id, lane_width, next_index=None, cell_size=None):
+        self.resolution = resolution
+        self.positions = np.asarray(positions, dtype=np.float64)
+        self.yaw = np.asarray(yaw, dtype=np.float64)
+        self.road_id = np.asarray(road_id, dtype=np.int64)
+        self.lane_id = np.asarray(lane_id, dtype=np.int64)
+        self.lane_width = np.asarray(lane_width, dtype=np.float64)
+        self.next_index = np.arange(len(self.positions)) if next_index is None else np.asarray(next_index, dtype=np.int64)
+        self.cell_size = cell_size or max(2.5 * resolution, 5.0)
+        self._build_grid()
+
+    def _build_grid(self):
+        """Dense grid of cells, each listing the waypoints in its 3x3 neighbourhood (padded with -1)"""
+        xy = self.positions[:, :2]
+        self._origin = xy.min(axis=0) - self.cell_size if len(xy) else np.zeros(2)
+        cells = np.floor((xy - self._origin) / self.cell_size).astype(np.int64)
+        shape = cells.max(axis=0) + 2 if len(xy) else np.array([1, 1])
+        buckets = {}
+        for i, (cx, cy) in enumerate(cells):
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    buckets.setdefault((cx + dx, cy + dy), []).append(i)
+        buckets = {c: idx for c, idx in buckets.items() if 0 <= c[0] < shape[0] and 0 <= c[1] < shape[1]}
+        width = max((len(v) for v in buckets.values()), default=1)
+        self._grid = np.full(tuple(shape), -1, dtype=np.int64)
+        self._candidates = np.full((len(buckets), width), -1, dtype=np.int64)
+        for row, (cell, members) in enumerate(buckets.items()):
+            self._grid[cell] = row
+            self._candidates[row, :len(members)] = members
+
+    def nearest(self, positions):
+        """Index of the nearest waypoint for each position"""
+        query = np.atleast_2d(np.asarray(positions, dtype=np.float64))[:, :2]
+        result = np.full(len(query), -1, dtype=np.int64)
+        best = np.full(len(query), np.inf)
+        cells = np.floor((query - self._origin) / self.cell_size).astype(np.int64)
+        inside = np.all((cells >= 0) & (cells < self._grid.shape), axis=1)
+        rows = np.full(len(query), -1, dtype=np.int64)
+        rows[inside] = self._grid[cells[inside, 0], cells[inside, 1]]
+
+        hit = rows >= 0
+        if hit.any():
+            candidates = self._candidates[rows[hit]]
+            valid = candidates >= 0
+            diff = self.positions[np.where(valid, candidates, 0), :2] - query[hit, None, :]
+            dist = np.where(valid, np.einsum("ijk,ijk->ij", diff, diff), np.inf)
+            j = np.argmin(dist, axis=1)
+            result[hit] = candidates[np.arange(len(j)), j]
+            best[hit] = dist[np.arange(len(j)), j]
+
+        # Anything not provably resolved inside its neighbourhood falls back to a brute-force scan
+        fallback = np.nonzero(best > self.cell_size ** 2)[0]
+        for start in range(0, len(fallback), 256):
+            chunk = fallback[start:start + 256]
+            diff = self.positions[None, :, :2] - query[chunk, None, :]
+            result[chunk] = np.argmin(np.einsum("ijk,ijk->ij", diff, diff), axis=1)
+        return result
+
+    def nearest_lane(self, positions):
+        """Nearest lane waypoint per position: dict of arrays (index, x, y, z, yaw, road_id, lane_id, lane_width, distance)"""
+        query = np.atleast_2d(np.asarray(positions, dtype=np.float64))
+        idx = self.nearest(query)
+        return {
+            "index": idx,
+            "x": self.positions[idx, 0],
+            "y": self.positions[idx, 1],
+            "z": self.positions[idx, 2],
+            "yaw": self.yaw[idx],
+            "road_id": self.road_id[idx],
+            "lane_id": self.lane_id[idx],
+            "lane_width": self.lane_width[idx],
+            "distance": np.hypot(self.positions[idx, 0] - query[:, 0], self.positions[idx, 1] - query[:, 1]),
+        }
+
+    def lane_heading(self, positions):
+        """Yaw in degrees of the nearest lane for each position"""
+        return self.yaw[self.nearest(positions)]
+
+    def lookahead(self, positions, distance):
+        """Point `distance` metres ahead along the nearest lane, for each position; (N, 3) array"""
+        idx = self.nearest(positions)
+        steps = np.broadcast_to(np.ceil(np.asarray(distance, dtype=np.float64) / self.resolution).astype(np.int64), idx.shape)
+        for step in range(int(steps.max()) if len(steps) else 0):
+            idx = np.where(step < steps, self.next_index[idx], idx)
+        return self.positions[idx]
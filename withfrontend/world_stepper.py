@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from fleet_telemetry import FleetTelemetry
+from fleet_control import FleetController
+
+
+SYNC_DELTA = float(os.environ.get("CARLA_SYNC_DELTA", "0.05"))  # Simulated seconds per tick
+
+
+class WorldStepper:
+    """Runs the server in synchronous mode and steps the whole fleet pipeline once per world tick
+
+    Each frame is world.tick(), telemetry from that frame's snapshot, one fleet
+    control step, then a wait until every camera due that frame has delivered
+    it. Frames are paced to wall time, or ticked back to back in max speed mode.
+    """
+    _instances = {}  # Dictionary to store steppers by server endpoint
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, connection):
+        """Get or create the stepper for the server behind a connection"""
+        with cls._instances_lock:
+            if connection.endpoint not in cls._instances:
+                cls._instances[connection.endpoint] = cls(connection)
+            return cls._instances[connection.endpoint]
+
+    @classmethod
+    def all_instances(cls):
+        with cls._instances_lock:
+            return dict(cls._instances)
+
+    def __init__(self, connection, delta=SYNC_DELTA, sensor_timeout=1.0):
+        self.connection = connection
+        self.delta = delta
+        self.max_speed = False
+        self.sensor_timeout = sensor_timeout  # Seconds to wait for due cameras each frame
+        self.running = False
+        self._thread = None
+        self._original_settings = None
+        self._controllers = {}
+        self._sensor_frames = {}  # robot_id -> (frame, sim time) of the last delivered image, seeded on start
+        self._sensor_cond = threading.Condition()
+        self.stats = {"frames": 0, "frame": None, "sim_time": 0.0, "realtime_factor": 0.0, "sensor_timeouts": 0,
+                      "last_tick_ms": 0.0, "avg_tick_ms": 0.0, "last_pipeline_ms": 0.0, "avg_pipeline_ms": 0.0,
+                      "last_sensor_wait_ms": 0.0}
+
+    def register(self, controller):
+        with self._sensor_cond:
+            self._controllers[controller.robot_id] = controller
+
+    def unregister(self, robot_id):
+        with self._sensor_cond:
+            self._controllers.pop(robot_id, None)
+            self._sensor_frames.pop(robot_id, None)
+            self._sensor_cond.notify_all()
+
+    def sensor_started(self, robot_id):
+        """Called when a camera starts or resumes listening; it is due again from its next own tick"""
+        with self._sensor_cond:
+            self._sensor_frames.pop(robot_id, None)
+
+    def sensor_delivered(self, robot_id, frame, timestamp):
+        """Called from camera callbacks so the stepper knows a frame's images have arrived"""
+        if not self.running:
+            return
+        with self._sensor_cond:
+            self._sensor_frames[robot_id] = (frame, timestamp)
+            self._sensor_cond.notify_all()
+
+    def get_stats(self):
+        return dict(self.stats, running=self.running, delta=self.delta, max_speed=self.max_speed)
+
+    def start(self, delta=None, max_speed=False):
+        if self.running:
+            return "⚠️ Synchronous stepping already running."
+        if delta is not None:
+            self.delta = float(delta)
+        self.max_speed = bool(max_speed)
+
+        try:
+            world = self.connection.world
+            settings = world.get_settings()
+            self._original_settings = (settings.synchronous_mode, settings.fixed_delta_seconds)
+            settings.synchronous_mode = True
+            settings.fixed_delta_seconds = self.delta
+            self.connection.call(lambda: world.apply_settings(settings))
+        except Exception as e:
+            print(f"❌ Failed to enable synchronous mode: {e}")
+            return f"❌ Synchronous mode failed: {e}"
+
+        # Deliveries recorded before this run say nothing about the sensor ticks of the next frames
+        with self._sensor_cond:
+            self._sensor_frames.clear()
+        # Telemetry and control now run inside the frame pipeline instead of on their own clocks
+        FleetTelemetry.get_instance(self.connection).set_external_clock(True)
+        FleetController.get_instance(self.connection).set_external_clock(True)
+        self.running = True
+        self._thread = threading.Thread(target=self._loop, name="world-stepper", daemon=True)
+        self._thread.start()
+        mode = "max speed" if self.max_speed else "real time"
+        return f"✅ Synchronous stepping started ({self.delta}s per frame, {mode})."
+
+    def stop(self):
+        if not self.running:
+            return "Synchronous stepping not running."
+        self.running = False
+        with self._sensor_cond:
+            self._sensor_cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.sensor_timeout + 5.0)
+        self._thread = None
+
+        try:
+            world = self.connection.world
+            settings = world.get_settings()
+            settings.synchronous_mode, settings.fixed_delta_seconds = self._original_settings
+            self.connection.call(lambda: world.apply_settings(settings))
+        except Exception as e:
+            print(f"⚠️ Warning while restoring asynchronous mode: {e}")
+        FleetTelemetry.get_instance(self.connection).set_external_clock(False)
+        FleetController.get_instance(self.connection).set_external_clock(False)
+        return "✅ Synchronous stepping stopped."
+
+    def _due_sensors(self, sim_time):
+        # Caller holds the condition lock; cameras slower than the tick rate are only due on their own ticks
+        due = []
+        for robot_id, controller in self._controllers.items():
+            profile = controller.camera_profile
+            if controller.camera is None or not controller.streaming or controller.camera_paused or profile is None:
+                continue
+            last = self._sensor_frames.get(robot_id)
+            if last is None:
+                # A camera that just started is treated as having delivered the previous frame,
+                # so one slower than the tick rate is not waited on before its first tick is due
+                last = self._sensor_frames[robot_id] = (0, sim_time - self.delta)
+            if sim_time - last[1] >= profile.sensor_tick - self.delta / 2:
+                due.append(robot_id)
+        return due
+
+    def _wait_for_sensors(self, frame, sim_time):
+        with self._sensor_cond:
+            due = self._due_sensors(sim_time)
+            delivered = self._sensor_cond.wait_for(
+                lambda: not self.running or all(self._sensor_frames.get(r, (0, 0.0))[0] >= frame for r in due),
+                self.sensor_timeout)
+        if not delivered:
+            self.stats["sensor_timeouts"] += 1
+
+    def _loop(self):
+        telemetry = FleetTelemetry.get_instance(self.connection)
+        fleet = FleetController.get_instance(self.connection)
+        started_wall = time.monotonic()
+        started_sim = None
+        next_frame = started_wall
+        while self.running:
+            tick_started = time.monotonic()
+            try:
+                world = self.connection.world
+                frame = world.tick()
+                snapshot = world.get_snapshot()
+            except Exception as e:
+                print(f"❌ World tick failed: {e}")
+                time.sleep(0.5)
+                continue
+            ticked = time.monotonic()
+
+            sim_time = snapshot.timestamp.elapsed_seconds
+            try:
+                telemetry.ingest(snapshot)
+                fleet.step(self.delta)
+            except Exception as e:
+                print(f"❌ Frame pipeline failed: {e}")
+            controls_sent = time.monotonic()
+            self._wait_for_sensors(frame, sim_time)
+            finished = time.monotonic()
+
+            if started_sim is None:
+                started_sim = sim_time
+            s = self.stats
+            s["frames"] += 1
+            n = s["frames"]
+            s["frame"] = frame
+            s["sim_time"] = sim_time
+            s["last_tick_ms"] = (ticked - tick_started) * 1000.0
+            s["avg_tick_ms"] += (s["last_tick_ms"] - s["avg_tick_ms"]) / n
+            s["last_pipeline_ms"] = (finished - tick_started) * 1000.0
+            s["avg_pipeline_ms"] += (s["last_pipeline_ms"] - s["avg_pipeline_ms"]) / n
+            s["last_sensor_wait_ms"] = (finished - controls_sent) * 1000.0
+            if finished > started_wall:
+                s["realtime_factor"] = (sim_time - started_sim + self.delta) / (finished - started_wall)
+
+            if not self.max_speed:
+                next_frame = max(next_frame + self.delta, finished - self.delta)
+                delay = next_frame - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)